@@ -0,0 +1,48 @@
+from __future__ import annotations
+
+import click
+import frappe
+from frappe.commands import get_site, pass_context
+
+
+@click.command("build-soil-raster")
+@click.option("--resolution", type=float, help="Grid cell size in degrees (default: site config or 0.01)")
+@pass_context
+def build_soil_raster(context, resolution=None):
+    """Rebuild the memory-mapped WA soil category grid used by get_soil_data."""
+    from probuild.probuild.soil_raster import build_soil_raster as build
+
+    site = get_site(context)
+    frappe.init(site=site)
+    frappe.connect()
+    try:
+        path = build(resolution=resolution)
+        click.echo(f"Soil raster written to {path}")
+    finally:
+        frappe.destroy()
+
+
+@click.command("backfill-soil")
+@click.option("--doctype", default="Opportunity", type=click.Choice(["Opportunity", "Prospect"]))
+@click.option("--concurrency", default=4, type=int, help="Maximum parallel ASRIS requests")
+@click.option("--batch-size", default=100, type=int)
+@click.option("--force", is_flag=True, default=False, help="Re-check records that already have soil data")
+@click.option("--reset", is_flag=True, default=False, help="Ignore the saved checkpoint and start over")
+@pass_context
+def backfill_soil(context, doctype, concurrency, batch_size, force=False, reset=False):
+    """Resolve and store soil data for existing records with site coordinates."""
+    from probuild.probuild.api.soil import backfill_soil_data
+
+    site = get_site(context)
+    frappe.init(site=site)
+    frappe.connect()
+    try:
+        count = backfill_soil_data(
+            doctype=doctype, concurrency=concurrency, batch_size=batch_size, force=force, reset=reset
+        )
+        click.echo(f"Stored soil data for {count} {doctype} record(s)")
+    finally:
+        frappe.destroy()
+
+
+commands = [build_soil_raster, backfill_soil]
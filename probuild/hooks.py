@@ -26,7 +26,10 @@ app_license = "mit"
 
 # include js, css files in header of desk.html
 # app_include_css = "/assets/probuild/css/probuild.css"
-app_include_js = "/assets/probuild/js/sms_notifications.js"
+app_include_js = [
+    "/assets/probuild/js/sms_notifications.js",
+    "/assets/probuild/js/soil_warning.js",
+]
 
 # Include JS in specific doctype views
 doctype_js = {
@@ -155,6 +158,10 @@ doc_events = {
 	# Lead uses default ERPNext naming (no autoname override) - it behaves like a contact
 	"Opportunity": {
 		"autoname": "probuild.probuild.events.opportunity_autoname",
+		"on_update": "probuild.probuild.events.enqueue_soil_lookup",
+	},
+	"Prospect": {
+		"on_update": "probuild.probuild.events.enqueue_soil_lookup",
 	},
 	"Quotation": {
 		"autoname": "probuild.probuild.events.quotation_autoname",
@@ -166,6 +173,41 @@ doc_events = {
 	"Sales Invoice": {
 		"autoname": "probuild.probuild.events.sales_invoice_autoname",
 	},
+	"Task": {
+		"validate": "probuild.probuild.events.task_validate",
+		"on_update": [
+			"probuild.probuild.events.task_on_change",
+			"probuild.probuild.shopfloor.publish_change",
+		],
+		"on_trash": [
+			"probuild.probuild.events.task_on_change",
+			"probuild.probuild.shopfloor.publish_change",
+		],
+	},
+	"Dispatch Deliverable": {
+		"on_update": [
+			"probuild.probuild.events.dispatch_on_change",
+			"probuild.probuild.shopfloor.publish_change",
+		],
+		"on_trash": [
+			"probuild.probuild.events.dispatch_on_change",
+			"probuild.probuild.shopfloor.publish_change",
+		],
+	},
+	"Kiosk Time Log": {
+		"on_update": "probuild.probuild.shopfloor.publish_change",
+		"on_trash": "probuild.probuild.shopfloor.publish_change",
+	},
+	# Low Stock Alert maintenance (see probuild.probuild.low_stock)
+	"Stock Ledger Entry": {
+		"on_submit": "probuild.probuild.low_stock.queue_bin_check",
+	},
+	"Bin": {
+		"on_update": "probuild.probuild.low_stock.queue_bin_check",
+	},
+	"Item": {
+		"on_update": "probuild.probuild.low_stock.on_item_update",
+	},
 }
 
 # Scheduled Tasks
@@ -189,6 +231,20 @@ doc_events = {
 # 	],
 # }
 
+scheduler_events = {
+	"cron": {
+		"*/5 * * * *": [
+			"probuild.probuild.api.wallboard.rebuild_board_snapshot",
+		],
+	},
+	"hourly": [
+		"probuild.probuild.tasks.stop_stale_kiosk_timers",
+	],
+	"daily": [
+		"probuild.probuild.api.kiosk.purge_kiosk_sync_events",
+	],
+}
+
 # Testing
 # -------
 
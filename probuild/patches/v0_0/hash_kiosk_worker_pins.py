@@ -0,0 +1,13 @@
+from __future__ import annotations
+
+import frappe
+
+from probuild.probuild.doctype.kiosk_worker.kiosk_worker import hash_pin
+
+
+def execute():
+    # Kiosk PIN checks compare against a salted hash instead of decrypting the Password field.
+    for worker in frappe.get_all("Kiosk Worker", filters={"pin_hash": ["is", "not set"]}, pluck="name"):
+        pin = frappe.get_password("Kiosk Worker", worker, "pin", raise_exception=False)
+        if pin:
+            frappe.db.set_value("Kiosk Worker", worker, "pin_hash", hash_pin(pin), update_modified=False)
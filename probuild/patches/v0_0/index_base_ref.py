@@ -0,0 +1,17 @@
+from __future__ import annotations
+
+import frappe
+
+# Every doctype that carries the MMYY-### base ref tying a job's documents together.
+BASE_REF_DOCTYPES = ("Opportunity", "Quotation", "Project", "Sales Invoice")
+
+
+def execute():
+    for doctype in BASE_REF_DOCTYPES:
+        if not frappe.db.has_column(doctype, "probuild_base_ref"):
+            continue
+        frappe.db.add_index(doctype, ["probuild_base_ref"])
+        # Keep the flag on the field definition so the index survives future field syncs.
+        frappe.db.set_value(
+            "Custom Field", {"dt": doctype, "fieldname": "probuild_base_ref"}, "search_index", 1
+        )
@@ -0,0 +1,37 @@
+from __future__ import annotations
+
+import frappe
+from frappe.utils import get_datetime
+
+
+def execute():
+    # Populate the running-timer registry (Kiosk Time Log.running_worker, unique).
+    # A worker can only hold one slot, so older duplicate Running logs left by the
+    # old check-then-insert race are stopped when the worker's next timer started.
+    running = frappe.get_all(
+        "Kiosk Time Log",
+        filters={"status": "Running"},
+        fields=["name", "worker", "started_at"],
+        order_by="worker asc, started_at desc",
+    )
+
+    newer_started: dict[str, object] = {}
+    for log in running:
+        if log.worker not in newer_started:
+            frappe.db.set_value("Kiosk Time Log", log.name, "running_worker", log.worker, update_modified=False)
+        else:
+            stopped_at = newer_started[log.worker]
+            frappe.db.set_value(
+                "Kiosk Time Log",
+                log.name,
+                {
+                    "status": "Stopped",
+                    "stopped_at": stopped_at,
+                    "duration_seconds": max(
+                        0, int((get_datetime(stopped_at) - get_datetime(log.started_at)).total_seconds())
+                    ),
+                    "notes": "Stopped by migration: duplicate running timer.",
+                },
+                update_modified=False,
+            )
+        newer_started[log.worker] = log.started_at
@@ -0,0 +1,42 @@
+from __future__ import annotations
+
+import frappe
+from frappe.custom.doctype.custom_field.custom_field import create_custom_fields
+
+from probuild.probuild.doctype.kiosk_daily_time_summary.kiosk_daily_time_summary import (
+    rebuild_kiosk_time_summary,
+)
+
+
+def execute():
+    # Kiosk hours rolled up from Kiosk Daily Time Summary (kept separate from ERPNext's
+    # timesheet-driven actual_time so the two don't overwrite each other).
+    create_custom_fields(
+        {
+            "Task": [
+                {
+                    "fieldname": "probuild_kiosk_hours",
+                    "fieldtype": "Float",
+                    "label": "Kiosk Hours",
+                    "read_only": 1,
+                    "no_copy": 1,
+                    "insert_after": "probuild_planned_date",
+                },
+            ],
+            "Project": [
+                {
+                    "fieldname": "probuild_kiosk_hours",
+                    "fieldtype": "Float",
+                    "label": "Kiosk Labour Hours",
+                    "read_only": 1,
+                    "no_copy": 1,
+                    "insert_after": "actual_time",
+                },
+            ],
+        },
+        update=True,
+    )
+    frappe.clear_cache(doctype="Task")
+    frappe.clear_cache(doctype="Project")
+
+    rebuild_kiosk_time_summary()
@@ -0,0 +1,10 @@
+from __future__ import annotations
+
+from probuild.probuild.doctype.kiosk_daily_time_summary.kiosk_daily_time_summary import (
+    rebuild_kiosk_time_summary,
+)
+
+
+def execute():
+    # Summary rows are now keyed per project too; re-derive them under the new names.
+    rebuild_kiosk_time_summary()
@@ -0,0 +1,8 @@
+from __future__ import annotations
+
+from probuild.probuild.low_stock import rebuild_low_stock_alerts
+
+
+def execute():
+    # Seed the alert table from current stock; stock movements keep it up to date from here.
+    rebuild_low_stock_alerts()
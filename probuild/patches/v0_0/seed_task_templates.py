@@ -0,0 +1,58 @@
+from __future__ import annotations
+
+import frappe
+
+# The task chains that used to be hardcoded in job_packet._get_task_template. Job Packet
+# job_type values ("Supply Only", "Supply & Install") become links to these templates.
+TEMPLATES = {
+    "Supply Only": {
+        "create_dispatches": 1,
+        "steps": [
+            ("ps1", "Production Sheet 1", "Production", ""),
+            ("m_posts", "Manufacture Posts", "Production", "ps1"),
+            ("dispatch_posts", "Dispatch Posts (Freight/Pickup)", "Production", "m_posts"),
+            ("await_measure", "Await Customer Measurements", "Scheduler", "dispatch_posts"),
+            ("ps2", "Production Sheet 2 (Panels)", "Production", "await_measure"),
+            ("m_panels", "Manufacture Panels", "Production", "ps2"),
+            ("dispatch_panels", "Dispatch Panels (Freight/Pickup)", "Production", "m_panels"),
+            ("closeout", "Closeout", "Scheduler", "dispatch_panels"),
+        ],
+    },
+    "Supply & Install": {
+        "create_dispatches": 0,
+        "steps": [
+            ("ps1", "Production Sheet 1", "Production", ""),
+            ("m_posts", "Manufacture Posts", "Production", "ps1"),
+            ("i_posts", "Install Posts", "Installation", "m_posts"),
+            ("measure", "Measure Panels Gap & Confirm", "Installation", "i_posts"),
+            ("ps2", "Production Sheet 2 (Panels)", "Production", "measure"),
+            ("m_panels", "Manufacture Panels", "Production", "ps2"),
+            ("i_panels", "Install Panels", "Installation", "m_panels"),
+            ("closeout", "Closeout", "Scheduler", "i_panels"),
+        ],
+    },
+}
+
+
+def execute():
+    for template_name, template in TEMPLATES.items():
+        if frappe.db.exists("Task Template", template_name):
+            continue
+        frappe.get_doc(
+            {
+                "doctype": "Task Template",
+                "template_name": template_name,
+                "enabled": 1,
+                "create_dispatches": template["create_dispatches"],
+                "steps": [
+                    {
+                        "doctype": "Task Template Step",
+                        "step_key": key,
+                        "subject": subject,
+                        "team": team,
+                        "depends_on": depends_on,
+                    }
+                    for key, subject, team, depends_on in template["steps"]
+                ],
+            }
+        ).insert(ignore_permissions=True)
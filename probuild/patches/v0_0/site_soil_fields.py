@@ -0,0 +1,97 @@
+from __future__ import annotations
+
+import frappe
+from frappe.custom.doctype.custom_field.custom_field import create_custom_fields
+
+
+def execute():
+    # Site coordinates plus the resolved soil lookup, filled in the background on save.
+    create_custom_fields(
+        {
+            "Opportunity": _site_soil_fields(insert_after="status"),
+            "Prospect": _site_soil_fields(insert_after="company_name"),
+        },
+        update=True,
+    )
+    frappe.clear_cache(doctype="Opportunity")
+    frappe.clear_cache(doctype="Prospect")
+
+
+def _site_soil_fields(insert_after: str) -> list[dict]:
+    return [
+        {
+            "fieldname": "probuild_site_sb",
+            "fieldtype": "Section Break",
+            "label": "Site & Soil",
+            "insert_after": insert_after,
+            "collapsible": 1,
+        },
+        {
+            "fieldname": "probuild_site_latitude",
+            "fieldtype": "Float",
+            "label": "Site Latitude",
+            "precision": "6",
+            "insert_after": "probuild_site_sb",
+        },
+        {
+            "fieldname": "probuild_site_longitude",
+            "fieldtype": "Float",
+            "label": "Site Longitude",
+            "precision": "6",
+            "insert_after": "probuild_site_latitude",
+        },
+        {
+            "fieldname": "probuild_soil_category",
+            "fieldtype": "Data",
+            "label": "Soil Category",
+            "read_only": 1,
+            "insert_after": "probuild_site_longitude",
+        },
+        {
+            "fieldname": "probuild_soil_type",
+            "fieldtype": "Data",
+            "label": "Soil Type (ASRIS)",
+            "read_only": 1,
+            "insert_after": "probuild_soil_category",
+        },
+        {
+            "fieldname": "probuild_soil_cb",
+            "fieldtype": "Column Break",
+            "insert_after": "probuild_soil_type",
+        },
+        {
+            "fieldname": "probuild_soil_region",
+            "fieldtype": "Data",
+            "label": "Soil Region",
+            "read_only": 1,
+            "insert_after": "probuild_soil_cb",
+        },
+        {
+            "fieldname": "probuild_soil_severity",
+            "fieldtype": "Data",
+            "label": "Soil Severity",
+            "read_only": 1,
+            "insert_after": "probuild_soil_region",
+        },
+        {
+            "fieldname": "probuild_soil_warning",
+            "fieldtype": "Small Text",
+            "label": "Soil Warning",
+            "read_only": 1,
+            "insert_after": "probuild_soil_severity",
+        },
+        {
+            "fieldname": "probuild_soil_equipment",
+            "fieldtype": "Small Text",
+            "label": "Soil Equipment",
+            "read_only": 1,
+            "insert_after": "probuild_soil_warning",
+        },
+        {
+            "fieldname": "probuild_soil_checked_on",
+            "fieldtype": "Datetime",
+            "label": "Soil Checked On",
+            "read_only": 1,
+            "insert_after": "probuild_soil_equipment",
+        },
+    ]
@@ -0,0 +1,35 @@
+from __future__ import annotations
+
+import frappe
+from frappe.custom.doctype.custom_field.custom_field import create_custom_fields
+
+
+def execute():
+    # Stored effective due date (planned date, else expected end) so the wallboard and
+    # capacity views can filter and sort on it in SQL. Kept in sync by events.task_validate.
+    create_custom_fields(
+        {
+            "Task": [
+                {
+                    "fieldname": "probuild_due_date",
+                    "fieldtype": "Date",
+                    "label": "Due Date",
+                    "read_only": 1,
+                    "no_copy": 1,
+                    "search_index": 1,
+                    "insert_after": "probuild_planned_date",
+                },
+            ]
+        },
+        update=True,
+    )
+    frappe.clear_cache(doctype="Task")
+
+    frappe.db.sql(
+        """
+        update `tabTask`
+        set probuild_due_date = coalesce(probuild_planned_date, exp_end_date)
+        where not (probuild_due_date <=> coalesce(probuild_planned_date, exp_end_date))
+        """
+    )
+    frappe.db.add_index("Task", ["probuild_due_date", "status"], "probuild_due_date_status_index")
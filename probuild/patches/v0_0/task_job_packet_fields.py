@@ -0,0 +1,35 @@
+from __future__ import annotations
+
+import frappe
+from frappe.custom.doctype.custom_field.custom_field import create_custom_fields
+
+
+def execute():
+    # Link generated tasks back to their Job Packet and template step, so approvals can be
+    # checked for existing tasks and chains can be found without matching on subject.
+    create_custom_fields(
+        {
+            "Task": [
+                {
+                    "fieldname": "probuild_job_packet",
+                    "fieldtype": "Link",
+                    "label": "Job Packet",
+                    "options": "Job Packet",
+                    "read_only": 1,
+                    "no_copy": 1,
+                    "search_index": 1,
+                    "insert_after": "probuild_due_date",
+                },
+                {
+                    "fieldname": "probuild_template_key",
+                    "fieldtype": "Data",
+                    "label": "Template Step",
+                    "read_only": 1,
+                    "no_copy": 1,
+                    "insert_after": "probuild_job_packet",
+                },
+            ]
+        },
+        update=True,
+    )
+    frappe.clear_cache(doctype="Task")
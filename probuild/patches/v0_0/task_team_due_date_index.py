@@ -0,0 +1,8 @@
+from __future__ import annotations
+
+import frappe
+
+
+def execute():
+    # Per-team board sections and capacity views filter on team, then range/sort on due date.
+    frappe.db.add_index("Task", ["probuild_team", "probuild_due_date", "status"], "probuild_team_due_date_index")
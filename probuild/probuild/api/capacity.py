@@ -0,0 +1,22 @@
+from __future__ import annotations
+
+from typing import Any
+
+import frappe
+
+from probuild.probuild.capacity_forecast import DEFAULT_FORECAST_DAYS, build_forecast
+
+
+@frappe.whitelist()
+def get_capacity_forecast(
+    from_date: str | None = None, days: int = DEFAULT_FORECAST_DAYS, teams: str | list[str] | None = None
+) -> dict[str, Any]:
+    """
+    Team x day capacity heatmap: {"days", "teams", "capacity", "load", "variance", "backlog",
+    "utilisation", "tasks", "opening_backlog"}, each series a list of rows (one per team).
+    """
+    if not frappe.has_permission("Task", "read"):
+        frappe.throw("Not permitted.", frappe.PermissionError)
+    if isinstance(teams, str):
+        teams = frappe.parse_json(teams) if teams.startswith("[") else [t for t in teams.split(",") if t]
+    return build_forecast(from_date, days, teams or None).as_dict()
@@ -0,0 +1,167 @@
+from __future__ import annotations
+
+import re
+from collections import defaultdict
+from typing import Any
+
+import frappe
+from frappe.utils import cint
+
+from probuild.probuild import reference
+
+MAX_BLOCK = 10000
+NUMBER_FIELDS = {
+    "Milestone": "probuild_milestone_index",
+    "Variation": "probuild_variation_no",
+    "Credit": "probuild_credit_no",
+}
+BASE_REF_PATTERN = re.compile(r"^(\d{4}-)(\d+)$")
+QUOTE_REF_PATTERN = re.compile(r"^(.+-Q)(\d+)$")
+
+
+@frappe.whitelist()
+def reserve_base_refs(count: int, mmyy: str | None = None) -> list[str]:
+    """Reserve a contiguous block of base refs (e.g. to pre-number an import file)."""
+    frappe.only_for("System Manager")
+    count = cint(count)
+    if not 0 < count <= MAX_BLOCK:
+        frappe.throw(f"Count must be between 1 and {MAX_BLOCK}.")
+    return reference.reserve_base_refs(count, mmyy)
+
+
+@frappe.whitelist()
+def bulk_import(doctype: str, records: str | list[dict], mmyy: str | None = None) -> dict[str, Any]:
+    """
+    Insert Opportunity / Quotation / Project / Sales Invoice records in one transaction.
+
+    Probuild refs are reserved in blocks up front (one series update per block, not per
+    record) and handed to the autoname hooks, which use them instead of taking the series
+    themselves. Records may carry their own historical refs (probuild_base_ref,
+    probuild_quote_ref, milestone / variation / credit numbers), which are kept; their series
+    and counters are first raised past them, so neither the reserved blocks nor later
+    autonaming issue those numbers again. The reservations are committed before any record
+    is inserted, so the series rows are not locked for the whole import.
+
+    All or nothing: if any record fails, nothing is imported and every failing row is
+    reported. The refs reserved for the import stay taken, leaving a gap in the series.
+    """
+    frappe.only_for("System Manager")
+    if doctype not in PREPARE:
+        frappe.throw(f"Bulk import is not supported for {doctype}.")
+    records = frappe.parse_json(records) if isinstance(records, str) else records
+    if not isinstance(records, list) or not 0 < len(records) <= MAX_BLOCK:
+        frappe.throw(f"Records must be a list of 1 to {MAX_BLOCK} rows.")
+
+    docs = [frappe.get_doc({**record, "doctype": doctype}) for record in records]
+    PREPARE[doctype](docs, mmyy)
+    # Release the series / counter row locks now: held until the import commits, they would
+    # stall (or time out) every interactive autoname on the same series meanwhile.
+    frappe.db.commit()
+
+    errors = []
+    for row, doc in enumerate(docs):
+        frappe.db.savepoint("probuild_import")
+        try:
+            doc.insert()
+        except (frappe.ValidationError, frappe.PermissionError, frappe.DuplicateEntryError) as e:
+            frappe.db.rollback(save_point="probuild_import")
+            frappe.clear_last_message()
+            errors.append({"row": row, "error": str(e)})
+
+    if errors:
+        frappe.db.rollback()
+        return {"imported": [], "errors": errors}
+    return {"imported": [doc.name for doc in docs], "errors": []}
+
+
+def _prepare_opportunities(docs: list, mmyy: str | None) -> None:
+    needs_ref = []
+    floors = defaultdict(int)
+    for doc in docs:
+        if doc.get("probuild_base_ref"):
+            doc.flags.probuild_base_ref = doc.probuild_base_ref
+            _note_floor(floors, BASE_REF_PATTERN, doc.probuild_base_ref)
+        else:
+            needs_ref.append(doc)
+    _raise_series_floors(floors)
+    if needs_ref:
+        for doc, base in zip(needs_ref, reference.reserve_base_refs(len(needs_ref), mmyy), strict=True):
+            doc.flags.probuild_base_ref = base
+
+
+def _prepare_quotations(docs: list, mmyy: str | None) -> None:
+    opportunity_bases = _base_refs("Opportunity", [doc.get("opportunity") for doc in docs])
+    by_base = defaultdict(list)
+    floors = defaultdict(int)
+    for doc in docs:
+        base = opportunity_bases.get(doc.get("opportunity"))
+        if not base:
+            continue  # quotation_autoname falls back to ERPNext naming
+        if doc.get("probuild_quote_ref"):
+            doc.flags.probuild_quote_ref = doc.probuild_quote_ref
+            _note_floor(floors, QUOTE_REF_PATTERN, doc.probuild_quote_ref)
+        else:
+            by_base[base].append(doc)
+    _raise_series_floors(floors)
+    for base, base_docs in by_base.items():
+        for doc, ref in zip(base_docs, reference.reserve_quote_refs(base, len(base_docs)), strict=True):
+            doc.flags.probuild_quote_ref = ref
+
+
+def _prepare_projects(docs: list, mmyy: str | None) -> None:
+    # Project names come straight from probuild_base_ref; there is no series to take.
+    pass
+
+
+def _prepare_sales_invoices(docs: list, mmyy: str | None) -> None:
+    project_bases = _base_refs("Project", [doc.get("project") for doc in docs if not doc.get("probuild_base_ref")])
+    by_counter = defaultdict(list)
+    floors = defaultdict(int)
+    for doc in docs:
+        base = doc.get("probuild_base_ref") or project_bases.get(doc.get("project"))
+        if not base:
+            continue  # sales_invoice_autoname falls back to ERPNext naming
+        kind = doc.get("probuild_invoice_kind") or ("Credit" if doc.get("is_return") else "Milestone")
+        doc.probuild_base_ref = base
+        doc.probuild_invoice_kind = kind
+        if number := cint(doc.get(NUMBER_FIELDS[kind])):
+            floors[(base, kind)] = max(floors[(base, kind)], number)
+        else:
+            by_counter[(base, kind)].append(doc)
+
+    # Before reserving, so the reserved blocks start after the imported numbers.
+    for (base, kind), number in floors.items():
+        reference.raise_ref_counter_floor(base, kind, number)
+    for (base, kind), counter_docs in by_counter.items():
+        first = reference.reserve_ref_counter_block(base, kind, len(counter_docs))
+        for offset, doc in enumerate(counter_docs):
+            doc.set(NUMBER_FIELDS[kind], first + offset)
+
+
+def _note_floor(floors: dict[str, int], pattern: re.Pattern, ref: str) -> None:
+    # Track the highest imported number per series prefix.
+    if match := pattern.match(ref):
+        floors[match[1]] = max(floors[match[1]], int(match[2]))
+
+
+def _raise_series_floors(floors: dict[str, int]) -> None:
+    # Before reserving, so the reserved blocks start after the imported refs.
+    for prefix, number in floors.items():
+        reference.raise_series_floor(prefix, number)
+
+
+def _base_refs(doctype: str, names: list[str | None]) -> dict[str, str]:
+    names = list({n for n in names if n})
+    if not names:
+        return {}
+    return dict(
+        frappe.get_all(doctype, filters={"name": ["in", names]}, fields=["name", "probuild_base_ref"], as_list=True)
+    )
+
+
+PREPARE = {
+    "Opportunity": _prepare_opportunities,
+    "Quotation": _prepare_quotations,
+    "Project": _prepare_projects,
+    "Sales Invoice": _prepare_sales_invoices,
+}
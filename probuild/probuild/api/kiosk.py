@@ -1,9 +1,42 @@
 from __future__ import annotations
 
+import base64
+import hashlib
+import hmac
+import json
+import time
+from datetime import datetime, timezone
 from typing import Any
+from zoneinfo import ZoneInfo
 
 import frappe
-from frappe.utils import now_datetime
+from frappe.utils import (
+    add_to_date,
+    cint,
+    convert_utc_to_system_timezone,
+    get_datetime,
+    get_system_timezone,
+    now_datetime,
+)
+from frappe.utils.password import get_encryption_key
+
+from probuild.probuild.doctype.kiosk_worker.kiosk_worker import check_pin, hash_pin
+from probuild.probuild.api.wallboard import get_board_teams
+from probuild.probuild.snapshot import get_snapshot, invalidate_snapshot_group, is_not_modified
+
+# Kiosk sessions: a worker enters their PIN once per station and gets a signed token.
+SESSION_TTL_SECONDS = 15 * 60
+MAX_PIN_FAILURES = 5
+PIN_LOCKOUT_SECONDS = 5 * 60
+
+# Offline events older than this (server time) are not replayed.
+OFFLINE_EVENT_WINDOW_SECONDS = 72 * 3600
+
+# Open tasks are shared by every kiosk (one snapshot per team filter) and rebuilt only when a
+# Task changes.
+OPEN_TASKS_SNAPSHOT_GROUP = "probuild:kiosk:open_tasks"
+OPEN_TASKS_SNAPSHOT_SIZE = 500
+OPEN_TASKS_SNAPSHOT_TTL = 10 * 60  # backstop in case an invalidation is ever missed
 
 
 def _require_logged_in():
@@ -12,13 +45,98 @@ def _require_logged_in():
 
 
 def _validate_worker_pin(worker: str, pin: str) -> None:
-    doc = frappe.get_doc("Kiosk Worker", worker)
-    if not doc.enabled:
+    failures_key = frappe.cache.make_key(f"probuild:kiosk_pin_failures:{worker}")
+    if cint(frappe.cache.get(failures_key)) >= MAX_PIN_FAILURES:
+        frappe.throw("Too many failed PIN attempts. Try again in a few minutes.")
+
+    row = frappe.db.get_value("Kiosk Worker", worker, ["enabled", "pin_hash"], as_dict=True)
+    if not row:
+        frappe.throw("Unknown worker.")
+    if not row.enabled:
         frappe.throw("Worker is disabled.")
-    stored = frappe.get_password("Kiosk Worker", worker, "pin")
-    if stored != pin:
+
+    if row.pin_hash:
+        valid = check_pin(pin, row.pin_hash)
+    else:
+        # Worker saved before PINs were hashed: compare once, then store the hash.
+        stored = frappe.get_password("Kiosk Worker", worker, "pin") or ""
+        valid = hmac.compare_digest(stored.encode(), (pin or "").encode())
+        if valid:
+            frappe.db.set_value("Kiosk Worker", worker, "pin_hash", hash_pin(pin), update_modified=False)
+
+    if not valid:
+        frappe.cache.incr(failures_key)
+        frappe.cache.expire(failures_key, PIN_LOCKOUT_SECONDS)
         frappe.throw("Invalid PIN.")
 
+    frappe.cache.delete(failures_key)
+
+
+def _session_ttl(station: str | None) -> int:
+    per_station = frappe.conf.get("probuild_kiosk_station_session_ttl") or {}
+    default = frappe.conf.get("probuild_kiosk_session_ttl") or SESSION_TTL_SECONDS
+    return cint(per_station.get(station or "", default))
+
+
+def _sign(payload: str) -> str:
+    return hmac.new(get_encryption_key().encode(), payload.encode(), hashlib.sha256).hexdigest()
+
+
+def _issue_session(worker: str, station: str | None) -> dict[str, Any]:
+    ttl = _session_ttl(station)
+    issued_at = int(time.time())
+    claims = {"w": worker, "s": station or "", "iat": issued_at, "exp": issued_at + ttl}
+    payload = base64.urlsafe_b64encode(json.dumps(claims, separators=(",", ":")).encode()).decode()
+    signature = _sign(payload)
+    # The Redis entry lets a session be revoked (worker disabled / PIN changed) before it expires.
+    frappe.cache.set_value(f"probuild:kiosk_session:{worker}:{signature}", 1, expires_in_sec=ttl)
+    return {"session": f"{payload}.{signature}", "expires_in": ttl}
+
+
+def _read_session(worker: str, session: str | None) -> tuple[dict[str, Any], str]:
+    """Return (claims, signature) of a kiosk session token after checking its signature."""
+    try:
+        payload, signature = (session or "").split(".")
+        claims = json.loads(base64.urlsafe_b64decode(payload.encode()))
+    except Exception:
+        frappe.throw("Invalid kiosk session.")
+
+    if not hmac.compare_digest(_sign(payload).encode(), signature.encode()) or claims.get("w") != worker:
+        frappe.throw("Invalid kiosk session.")
+    return claims, signature
+
+
+def _verify_session(worker: str, session: str, station: str | None = None) -> dict[str, Any]:
+    """Check a kiosk session token without touching the database."""
+    claims, signature = _read_session(worker, session)
+    if station and station != claims.get("s"):
+        frappe.throw("Kiosk session belongs to another station.")
+    if claims.get("exp", 0) < time.time() or not frappe.cache.get_value(
+        f"probuild:kiosk_session:{worker}:{signature}"
+    ):
+        frappe.throw("Kiosk session expired. Enter your PIN again.")
+    return claims
+
+
+def _authorize_worker(
+    worker: str, pin: str | None, session: str | None, station: str | None = None
+) -> str | None:
+    """Accept either a kiosk session token or a PIN; returns the station the worker is on."""
+    if session:
+        return _verify_session(worker, session, station).get("s") or station
+    if not pin:
+        frappe.throw("PIN required.")
+    _validate_worker_pin(worker, pin)
+    return station
+
+
+@frappe.whitelist()
+def open_session(worker: str, pin: str, station: str | None = None) -> dict[str, Any]:
+    """Check the PIN once and return a short-lived session token for later timer calls."""
+    _require_logged_in()
+    _validate_worker_pin(worker, pin)
+    return _issue_session(worker, station)
+
 
 @frappe.whitelist()
 def list_workers() -> list[dict[str, Any]]:
@@ -32,47 +150,291 @@ def list_workers() -> list[dict[str, Any]]:
 
 
 @frappe.whitelist()
-def list_open_tasks(limit: int = 200) -> list[dict[str, Any]]:
+def list_open_tasks(limit: int = 200, team: str | None = None) -> list[dict[str, Any]]:
     _require_logged_in()
-    limit = min(int(limit or 200), 500)
+    return _limit_open_tasks(_get_open_tasks_snapshot(team)["data"], limit)
+
+
+@frappe.whitelist()
+def get_open_tasks(limit: int = 200, team: str | None = None, etag: str | None = None) -> dict[str, Any]:
+    """
+    Open tasks for kiosks, served from a shared snapshot.
+
+    Pass back the `etag` from the previous response; if nothing changed the reply is
+    {"etag", "not_modified": True} and no task list is sent.
+    """
+    _require_logged_in()
+    snapshot = _get_open_tasks_snapshot(team)
+    view_etag = f"{snapshot['etag']}-{team or 'all'}-{limit}"
+    if is_not_modified(view_etag, etag):
+        return {"etag": view_etag, "not_modified": True}
+    return {"etag": view_etag, "tasks": _limit_open_tasks(snapshot["data"], limit)}
+
+
+def invalidate_open_tasks_snapshot() -> None:
+    invalidate_snapshot_group(OPEN_TASKS_SNAPSHOT_GROUP)
+
+
+def _get_open_tasks_snapshot(team: str | None) -> dict[str, Any]:
+    team = team or None
+    if team and team not in get_board_teams():
+        frappe.throw("Unknown team.")
+    return get_snapshot(
+        f"{OPEN_TASKS_SNAPSHOT_GROUP}:{team or '*'}",
+        lambda: _build_open_tasks(team),
+        expires_in_sec=OPEN_TASKS_SNAPSHOT_TTL,
+        group=OPEN_TASKS_SNAPSHOT_GROUP,
+    )
+
+
+def _build_open_tasks(team: str | None) -> list[dict[str, Any]]:
+    # Filtered by team in SQL, so a team's tasks are never crowded out by other teams'.
+    filters = {"status": ["not in", ["Completed", "Cancelled"]]}
+    if team:
+        filters["probuild_team"] = team
     return frappe.get_all(
         "Task",
-        filters={"status": ["not in", ["Completed", "Cancelled"]]},
+        filters=filters,
         fields=["name", "subject", "project", "status", "probuild_team", "expected_time", "probuild_planned_date", "exp_end_date"],
         order_by="modified desc",
-        limit=limit,
+        limit=OPEN_TASKS_SNAPSHOT_SIZE,
     )
 
 
+def _limit_open_tasks(tasks: list[dict[str, Any]], limit: int) -> list[dict[str, Any]]:
+    return tasks[: min(int(limit or 200), OPEN_TASKS_SNAPSHOT_SIZE)]
+
+
 @frappe.whitelist()
 def get_active_timer(worker: str) -> dict[str, Any] | None:
     _require_logged_in()
-    running = frappe.get_all(
-        "Kiosk Time Log",
-        filters={"worker": worker, "status": "Running"},
-        fields=["name", "task", "started_at", "station"],
-        order_by="started_at desc",
-        limit=1,
-    )
-    return running[0] if running else None
+    return _get_running_timer(worker)
 
 
 @frappe.whitelist()
-def start_timer(worker: str, pin: str, task: str, station: str | None = None) -> str:
+def start_timer(
+    worker: str,
+    task: str,
+    station: str | None = None,
+    pin: str | None = None,
+    session: str | None = None,
+) -> str:
     _require_logged_in()
-    _validate_worker_pin(worker, pin)
+    station = _authorize_worker(worker, pin, session, station)
+
+    try:
+        return _insert_timer(worker, task, station, now_datetime())
+    except frappe.UniqueValidationError:
+        # Another tap or station holds this worker's running slot.
+        frappe.clear_last_message()
+        existing = _get_running_timer(worker)
+        if existing and existing["task"] == task:
+            return existing["name"]
+        frappe.throw("You already have a running timer. Stop it before starting another task.")
+
+
+@frappe.whitelist()
+def stop_timer(
+    worker: str,
+    task: str | None = None,
+    pin: str | None = None,
+    session: str | None = None,
+) -> str:
+    _require_logged_in()
+    _authorize_worker(worker, pin, session)
 
-    existing = frappe.get_all(
+    running = _get_running_timer(worker, task)
+    if not running:
+        frappe.throw("No running timer found.")
+
+    return _close_timer(running["name"], now_datetime())
+
+
+@frappe.whitelist()
+def sync_kiosk_events(batch: str | list) -> list[dict[str, Any]]:
+    """
+    Apply start/stop events journaled by an offline kiosk.
+
+    Each event is {id, type: "start"|"stop", worker, task, station, session, ts} where `ts` is the
+    client clock in epoch milliseconds. Events are applied in client-time order in this request's
+    transaction and are idempotent on `id`, so a kiosk can resend its whole journal after a
+    timeout. Conflicts are resolved rather than failing the batch:
+
+    - start while the same task is running: no-op ("already_running")
+    - start while another task is running: the running timer stops at this event's time ("switched")
+    - stop with nothing running: ignored ("no_running_timer")
+
+    Every processed event's result is recorded (Kiosk Sync Event); a resent event gets the
+    same result back with `duplicate: true` instead of being applied again.
+
+    Returns one result per event: {id, status: applied|duplicate|conflict|rejected, ...}.
+    """
+    _require_logged_in()
+    events = frappe.parse_json(batch) or []
+    events = sorted(enumerate(events), key=lambda e: (cint(e[1].get("ts")), e[0]))
+    events = [e for _, e in events]
+
+    ids = [e.get("id") for e in events if e.get("id")]
+    recorded = {}
+    seen = set()
+    if ids:
+        recorded = {
+            r.name: frappe.parse_json(r.result)
+            for r in frappe.get_all("Kiosk Sync Event", filters={"name": ["in", ids]}, fields=["name", "result"])
+        }
+        # Events applied before results were recorded.
+        seen.update(frappe.get_all("Kiosk Time Log", filters={"client_start_id": ["in", ids]}, pluck="client_start_id"))
+        seen.update(frappe.get_all("Kiosk Time Log", filters={"client_stop_id": ["in", ids]}, pluck="client_stop_id"))
+
+    workers = {
+        w.name: w
+        for w in frappe.get_all(
+            "Kiosk Worker",
+            filters={"name": ["in", list({e.get("worker") for e in events})], "enabled": 1},
+            fields=["name", "sessions_revoked_on"],
+        )
+    }
+
+    results = []
+    processed = []
+    for event in events:
+        event_id = event.get("id")
+        if not event_id:
+            results.append({"id": None, "status": "rejected", "message": "Missing event id."})
+            continue
+        if event_id in recorded:
+            results.append({**recorded[event_id], "id": event_id, "duplicate": True})
+            continue
+        if event_id in seen:
+            results.append({"id": event_id, "status": "duplicate"})
+            continue
+
+        savepoint = f"kiosk_event_{len(results)}"
+        frappe.db.savepoint(savepoint)
+        try:
+            worker = workers.get(event.get("worker"))
+            if not worker:
+                frappe.throw("Worker is disabled.")
+            result = {"id": event_id, **_apply_kiosk_event(event, worker.sessions_revoked_on)}
+        except frappe.ValidationError as e:
+            frappe.db.rollback(save_point=savepoint)
+            frappe.clear_last_message()
+            result = {"id": event_id, "status": "rejected", "message": str(e)}
+        results.append(result)
+        recorded[event_id] = result
+        processed.append((event_id, event.get("worker"), result))
+
+    _record_sync_events(processed)
+    return results
+
+
+def _record_sync_events(processed: list[tuple[str, str | None, dict[str, Any]]]) -> None:
+    if not processed:
+        return
+    now = now_datetime()
+    user = frappe.session.user
+    frappe.db.bulk_insert(
+        "Kiosk Sync Event",
+        ["name", "creation", "modified", "modified_by", "owner", "event_id", "worker", "status", "result", "processed_on"],
+        [
+            (event_id, now, now, user, user, event_id, worker, result["status"], frappe.as_json(result), now)
+            for event_id, worker, result in processed
+        ],
+        # A concurrent resend of the same journal may have recorded it first.
+        ignore_duplicates=True,
+    )
+
+
+def purge_kiosk_sync_events() -> None:
+    """Daily: forget processed event ids once no kiosk could still resend them."""
+    cutoff = add_to_date(now_datetime(), seconds=-2 * OFFLINE_EVENT_WINDOW_SECONDS)
+    frappe.db.delete("Kiosk Sync Event", {"processed_on": ["<", cutoff]})
+
+
+def _apply_kiosk_event(event: dict[str, Any], sessions_revoked_on: datetime | None = None) -> dict[str, Any]:
+    worker = event["worker"]
+    at = _client_datetime(event.get("ts"))
+    happened = min(cint(event.get("ts")) / 1000, time.time()) if event.get("ts") else time.time()
+    if happened < time.time() - OFFLINE_EVENT_WINDOW_SECONDS:
+        frappe.throw("Event is too old to replay.")
+    station = _verify_offline_session(worker, event.get("session"), happened, sessions_revoked_on)
+    station = station or event.get("station")
+    running = _get_running_timer(worker)
+
+    if event.get("type") == "start":
+        task = event.get("task")
+        if not task:
+            frappe.throw("Task required.")
+        resolution = None
+        if running:
+            if running["task"] == task:
+                return {"status": "conflict", "resolution": "already_running", "log": running["name"]}
+            _close_timer(running["name"], at)
+            resolution = "switched"
+        log = _insert_timer(worker, task, station, at, client_event_id=event["id"])
+        return {"status": "conflict" if resolution else "applied", "resolution": resolution, "log": log}
+
+    if event.get("type") == "stop":
+        if event.get("task") and running and running["task"] != event["task"]:
+            running = None
+        if not running:
+            return {"status": "conflict", "resolution": "no_running_timer"}
+        return {"status": "applied", "log": _close_timer(running["name"], at, client_event_id=event["id"])}
+
+    frappe.throw("Unknown event type.")
+
+
+def _verify_offline_session(
+    worker: str, session: str | None, happened: float, sessions_revoked_on: datetime | None = None
+) -> str | None:
+    """
+    Like _verify_session, but for replayed events: the token must have been valid when the
+    event happened, not now (its Redis entry may be long gone after an outage), and must not
+    have been revoked since (the worker's sessions_revoked_on, kept in the database).
+    """
+    claims, _signature = _read_session(worker, session)
+    issued_at = cint(claims.get("iat"))
+    if not issued_at or happened < issued_at:
+        frappe.throw("Event predates its kiosk session.")
+    if claims.get("exp", 0) < happened:
+        frappe.throw("Kiosk session had expired when this event was recorded.")
+    if sessions_revoked_on and issued_at <= _system_timestamp(sessions_revoked_on):
+        frappe.throw("Kiosk session was revoked. Enter your PIN again.")
+    return claims.get("s")
+
+
+def _system_timestamp(value: datetime) -> float:
+    """Epoch seconds of a naive system-timezone datetime (as stored in the database)."""
+    return get_datetime(value).replace(tzinfo=ZoneInfo(get_system_timezone())).timestamp()
+
+
+def _client_datetime(ts: Any) -> datetime:
+    """Convert a client epoch-millisecond timestamp to a naive system-timezone datetime."""
+    now = now_datetime()
+    if not ts:
+        return now
+    utc = datetime.fromtimestamp(cint(ts) / 1000, tz=timezone.utc)
+    local = convert_utc_to_system_timezone(utc).replace(tzinfo=None)
+    # Never trust a kiosk clock that runs ahead of the server.
+    return min(local, now)
+
+
+def _get_running_timer(worker: str, task: str | None = None) -> dict[str, Any] | None:
+    # running_worker is unique and only set while Running: a single index lookup.
+    running = frappe.db.get_value(
         "Kiosk Time Log",
-        filters={"worker": worker, "status": "Running"},
-        fields=["name", "task"],
-        limit=1,
+        {"running_worker": worker},
+        ["name", "task", "started_at", "station"],
+        as_dict=True,
     )
-    if existing:
-        if existing[0]["task"] == task:
-            return existing[0]["name"]
-        frappe.throw("You already have a running timer. Stop it before starting another task.")
+    if running and task and running.task != task:
+        return None
+    return running
+
 
+def _insert_timer(
+    worker: str, task: str, station: str | None, started_at: datetime, client_event_id: str | None = None
+) -> str:
     project = frappe.db.get_value("Task", task, "project")
     log = frappe.get_doc(
         {
@@ -81,37 +443,21 @@ def start_timer(worker: str, pin: str, task: str, station: str | None = None) ->
             "task": task,
             "project": project,
             "status": "Running",
-            "started_at": now_datetime(),
+            "started_at": started_at,
             "station": station,
+            "client_start_id": client_event_id,
         }
     )
     log.insert(ignore_permissions=True)
     return log.name
 
 
-@frappe.whitelist()
-def stop_timer(worker: str, pin: str, task: str | None = None) -> str:
-    _require_logged_in()
-    _validate_worker_pin(worker, pin)
-
-    filters = {"worker": worker, "status": "Running"}
-    if task:
-        filters["task"] = task
-
-    running = frappe.get_all(
-        "Kiosk Time Log",
-        filters=filters,
-        fields=["name"],
-        order_by="started_at desc",
-        limit=1,
-    )
-    if not running:
-        frappe.throw("No running timer found.")
-
-    log = frappe.get_doc("Kiosk Time Log", running[0]["name"])
+def _close_timer(name: str, stopped_at: datetime, client_event_id: str | None = None) -> str:
+    log = frappe.get_doc("Kiosk Time Log", name, for_update=True)
+    if log.status != "Running":
+        return log.name
     log.status = "Stopped"
-    log.stopped_at = now_datetime()
+    log.stopped_at = max(stopped_at, get_datetime(log.started_at))
+    log.client_stop_id = client_event_id
     log.save(ignore_permissions=True)
     return log.name
-
-
@@ -0,0 +1,20 @@
+from __future__ import annotations
+
+from typing import Any
+
+import frappe
+
+from probuild.probuild.availability import get_allocation_shortfalls
+
+
+@frappe.whitelist()
+def get_material_shortfalls(allocation: str | None = None) -> list[dict[str, Any]]:
+    """
+    Item / warehouse shortfalls net of unissued allocations: for one Job Material Allocation,
+    or for every Draft / Allocated one when `allocation` is omitted.
+    """
+    if allocation:
+        frappe.has_permission("Job Material Allocation", "read", allocation, throw=True)
+    elif not frappe.has_permission("Job Material Allocation", "read"):
+        frappe.throw("Not permitted.", frappe.PermissionError)
+    return get_allocation_shortfalls(allocation)
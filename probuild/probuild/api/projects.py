@@ -0,0 +1,157 @@
+from __future__ import annotations
+
+from typing import Any
+
+import frappe
+
+from probuild.probuild.critical_path import get_critical_paths
+
+
+@frappe.whitelist()
+def get_critical_path(project: str | None = None, projects: str | list[str] | None = None) -> dict[str, Any]:
+    """
+    Critical path, per-task earliest/latest start and slack for one `project`, or for many
+    `projects` at once ({project: result}).
+    """
+    if not frappe.has_permission("Task", "read"):
+        frappe.throw("Not permitted.", frappe.PermissionError)
+    if project:
+        return get_critical_paths([project])[project]
+    if isinstance(projects, str):
+        projects = frappe.parse_json(projects) if projects.startswith("[") else [p for p in projects.split(",") if p]
+    return get_critical_paths(projects or [])
+
+
+@frappe.whitelist()
+def get_job_dossier(base_ref: str) -> dict[str, Any]:
+    """
+    Everything filed under one MMYY-### base ref: opportunities, quotations, projects, job
+    packets, tasks (with critical path), dispatches, kiosk time and invoices. Each section is
+    one query on an indexed base ref or project link, whatever the size of the job.
+
+    Sections go through frappe.get_list, so they only hold records the user may read; a
+    section whose doctype the user cannot read at all is left out.
+    """
+    if not frappe.has_permission("Project", "read"):
+        frappe.throw("Not permitted.", frappe.PermissionError)
+    if not base_ref:
+        frappe.throw("Base ref is required.")
+
+    by_ref = {"probuild_base_ref": base_ref}
+    dossier: dict[str, Any] = {"base_ref": base_ref}
+    _add_section(
+        dossier,
+        "opportunities",
+        "Opportunity",
+        filters=by_ref,
+        fields=["name", "status", "party_name", "opportunity_amount", "probuild_soil_category", "creation"],
+        order_by="creation asc",
+    )
+    _add_section(
+        dossier,
+        "quotations",
+        "Quotation",
+        filters=by_ref,
+        fields=["name", "status", "docstatus", "opportunity", "transaction_date", "valid_till", "grand_total"],
+        order_by="creation asc",
+    )
+    _add_section(
+        dossier,
+        "projects",
+        "Project",
+        filters=by_ref,
+        fields=["name", "project_name", "status", "percent_complete", "probuild_kiosk_hours"],
+        order_by="creation asc",
+    )
+    _add_section(
+        dossier,
+        "invoices",
+        "Sales Invoice",
+        filters=by_ref,
+        fields=[
+            "name",
+            "status",
+            "docstatus",
+            "posting_date",
+            "probuild_invoice_kind",
+            "probuild_display_ref",
+            "grand_total",
+            "outstanding_amount",
+        ],
+        order_by="posting_date asc, creation asc",
+    )
+
+    projects = [p.name for p in dossier["projects"]]
+    by_project = {"project": ["in", projects]}
+    _add_section(
+        dossier,
+        "job_packets",
+        "Job Packet",
+        filters=by_project,
+        fields=["name", "project", "job_type", "status", "revision", "approval_status", "approved_on"],
+        order_by="creation asc",
+        no_rows=not projects,
+    )
+    _add_section(
+        dossier,
+        "tasks",
+        "Task",
+        filters=by_project,
+        fields=[
+            "name",
+            "project",
+            "subject",
+            "status",
+            "probuild_team",
+            "probuild_due_date",
+            "expected_time",
+            "probuild_kiosk_hours",
+            "probuild_job_packet",
+        ],
+        order_by="lft asc",
+        no_rows=not projects,
+    )
+    _add_section(
+        dossier,
+        "dispatches",
+        "Dispatch Deliverable",
+        filters=by_project,
+        fields=["name", "project", "job_packet", "deliverable_type", "status", "due_date", "dispatch_method"],
+        order_by="due_date asc",
+        no_rows=not projects,
+    )
+    _add_section(
+        dossier,
+        "time",
+        "Kiosk Daily Time Summary",
+        filters=by_project,
+        fields=["project", "worker", "sum(duration_seconds) / 3600 as hours", "sum(log_count) as logs"],
+        group_by="project, worker",
+        order_by="hours desc",
+        no_rows=not projects,
+    )
+    if "tasks" in dossier:
+        readable = {t.name for t in dossier["tasks"]}
+        dossier["critical_paths"] = {
+            project: _readable_path(path, readable)
+            for project, path in (get_critical_paths(projects) if projects else {}).items()
+        }
+    return dossier
+
+
+def _add_section(dossier: dict[str, Any], key: str, doctype: str, no_rows: bool = False, **kwargs) -> None:
+    # Omit sections the user cannot read rather than failing the whole dossier.
+    if frappe.has_permission(doctype, "read"):
+        # No page limit, as with frappe.get_all.
+        dossier[key] = [] if no_rows else frappe.get_list(doctype, limit_page_length=0, **kwargs)
+
+
+def _readable_path(path: dict[str, Any], readable: set[str]) -> dict[str, Any]:
+    # Critical paths are computed (and cached) over every task; keep only the tasks in the
+    # permission-filtered Task section.
+    return {
+        **path,
+        "critical_path": [t for t in path["critical_path"] if t in readable],
+        "cycle": [t for t in path["cycle"] if t in readable],
+        "tasks": {t: info for t, info in path["tasks"].items() if t in readable},
+    }
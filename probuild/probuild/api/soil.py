@@ -1,7 +1,19 @@
 from __future__ import annotations
 
+from concurrent.futures import ThreadPoolExecutor
+
 import frappe
 import requests
+from frappe.utils import now_datetime
+
+from probuild.probuild import soil_classifier
+from probuild.probuild.soil_raster import (
+    ASRIS_CODE_OFFSET,
+    BOUNDARY_CODE,
+    lookup_code,
+    remember_asris_category,
+    zones_fingerprint,
+)
 
 
 # Soil type classifications and their warnings/equipment for WA fencing
@@ -117,6 +129,10 @@ WA_GEOLOGICAL_ZONES = [
     },
 ]
 
+_SOIL_CATEGORIES = list(SOIL_WARNINGS)
+# rules signature -> raster fingerprint (the rules can change at runtime)
+_raster_fingerprints: dict[str, bytes] = {}
+
 
 @frappe.whitelist()
 def get_soil_data(latitude: float, longitude: float) -> dict:
@@ -128,7 +144,20 @@ def get_soil_data(latitude: float, longitude: float) -> dict:
     """
     lat = float(latitude)
     lng = float(longitude)
-    
+    return resolve_soil_data(lat, lng, _fetch_asris_logged(lat, lng))
+
+
+def _fetch_asris_logged(lat: float, lng: float) -> dict | None:
+    # Try to fetch actual soil data from CSIRO ASRIS for soil type name
+    try:
+        return fetch_asris_soil(lat, lng)
+    except Exception as e:
+        frappe.log_error(f"ASRIS API error: {e}", "Probuild Soil Lookup")
+        return None
+
+
+def resolve_soil_data(lat: float, lng: float, asris_data: dict | None) -> dict:
+    """Build the soil result for a point from local zones and an (already fetched) ASRIS response."""
     result = {
         "soil_type": "",
         "soil_category": "",
@@ -140,36 +169,25 @@ def get_soil_data(latitude: float, longitude: float) -> dict:
         "severity": "none",
     }
     
-    # Check known geological zones (fast local check)
-    for zone in WA_GEOLOGICAL_ZONES:
-        if (zone["lat_min"] <= lat <= zone["lat_max"] and 
-            zone["lng_min"] <= lng <= zone["lng_max"]):
-            
-            soil_cat = zone["soil_type"]
-            soil_info = SOIL_WARNINGS.get(soil_cat, {})
-            
-            result["zone_name"] = zone["name"]
-            result["region"] = zone["region"]
-            result["soil_category"] = soil_cat
-            result["warning"] = soil_info.get("warning", "")
-            result["equipment"] = soil_info.get("equipment", [])
-            result["severity"] = soil_info.get("severity", "none")
-            result["is_limestone"] = soil_cat in ["limestone", "sand_over_limestone", "rock"]
-            break
+    # Check known geological zones (one byte from the precomputed raster when built)
+    zone, cached_category = _match_zone(lat, lng)
+    if zone:
+        _apply_category(result, zone["soil_type"])
+        result["zone_name"] = zone["name"]
+        result["region"] = zone["region"]
     
-    # Try to fetch actual soil data from CSIRO ASRIS for soil type name
-    try:
-        asris_data = fetch_asris_soil(lat, lng)
-        if asris_data and asris_data.get("soil_type"):
-            result["soil_type"] = asris_data["soil_type"]
-            if not result["region"] and asris_data.get("region"):
-                result["region"] = asris_data["region"]
-    except Exception as e:
-        frappe.log_error(f"ASRIS API error: {e}", "Probuild Soil Lookup")
+    if asris_data and asris_data.get("soil_type"):
+        result["soil_type"] = asris_data["soil_type"]
+        if not result["region"] and asris_data.get("region"):
+            result["region"] = asris_data["region"]
     
     # If we got soil type from ASRIS but no local zone match, try to classify it
     if result["soil_type"] and not result["soil_category"]:
         result = classify_soil_type(result)
+        remember_asris_category(lat, lng, result["soil_category"])
+    elif cached_category and not result["soil_category"]:
+        # ASRIS failed (or was skipped): fall back to the category learned for this cell.
+        _apply_category(result, cached_category)
     
     # Fallback region
     if not result["region"]:
@@ -181,50 +199,154 @@ def get_soil_data(latitude: float, longitude: float) -> dict:
     return result
 
 
+def store_soil_data(doctype: str, name: str) -> None:
+    """Background job: resolve soil for a record's site coordinates and store it on the record."""
+    coords = frappe.db.get_value(doctype, name, ["probuild_site_latitude", "probuild_site_longitude"])
+    if not coords or not (coords[0] and coords[1]):
+        return
+    lat, lng = float(coords[0]), float(coords[1])
+    asris_data = _fetch_asris_logged(lat, lng)
+    result = resolve_soil_data(lat, lng, asris_data)
+    frappe.db.set_value(doctype, name, _soil_field_values(result, asris_data), update_modified=False)
+
+
+def backfill_soil_data(
+    doctype: str = "Opportunity",
+    concurrency: int = 4,
+    batch_size: int = 100,
+    force: bool = False,
+    reset: bool = False,
+) -> int:
+    """
+    Resolve and store soil data for existing records that have site coordinates.
+
+    ASRIS requests for a batch run in parallel (at most `concurrency` at once); the records are
+    then written and committed, and the last processed name is checkpointed so an interrupted
+    run resumes where it stopped. Without `force`, records already checked are skipped.
+    """
+    # Checkpoint in the database (not the cache), committed with each batch it covers.
+    checkpoint_key = f"probuild_soil_backfill:{doctype}"
+    if reset:
+        frappe.defaults.clear_default(checkpoint_key)
+
+    filters = {"probuild_site_latitude": ["!=", 0], "probuild_site_longitude": ["!=", 0]}
+    if not force:
+        filters["probuild_soil_checked_on"] = ["is", "not set"]
+
+    processed = 0
+    last_name = frappe.db.get_default(checkpoint_key)
+    with ThreadPoolExecutor(max_workers=max(1, int(concurrency))) as pool:
+        while True:
+            batch_filters = dict(filters)
+            if last_name:
+                batch_filters["name"] = [">", last_name]
+            rows = frappe.get_all(
+                doctype,
+                filters=batch_filters,
+                fields=["name", "probuild_site_latitude", "probuild_site_longitude"],
+                order_by="name asc",
+                limit=batch_size,
+            )
+            if not rows:
+                break
+
+            # Only the HTTP calls run in threads; frappe.db is not thread-safe.
+            asris_results = pool.map(
+                lambda r: fetch_asris_soil(r.probuild_site_latitude, r.probuild_site_longitude), rows
+            )
+            for row, asris_data in zip(rows, asris_results, strict=True):
+                result = resolve_soil_data(row.probuild_site_latitude, row.probuild_site_longitude, asris_data)
+                frappe.db.set_value(
+                    doctype, row.name, _soil_field_values(result, asris_data), update_modified=False
+                )
+
+            last_name = rows[-1].name
+            frappe.db.set_default(checkpoint_key, last_name)
+            frappe.db.commit()
+            processed += len(rows)
+
+    frappe.defaults.clear_default(checkpoint_key)
+    frappe.db.commit()
+    return processed
+
+
+def _soil_field_values(result: dict, asris_data: dict | None) -> dict:
+    values = {
+        "probuild_soil_category": result["soil_category"],
+        "probuild_soil_type": result["soil_type"],
+        "probuild_soil_region": result["region"],
+        "probuild_soil_severity": result["severity"],
+        "probuild_soil_warning": result["warning"],
+        "probuild_soil_equipment": result["equipment_str"],
+    }
+    # Only a completed ASRIS lookup counts as checked: a failed one leaves the record for the
+    # next backfill run to retry.
+    if asris_data is not None:
+        values["probuild_soil_checked_on"] = now_datetime()
+    return values
+
+
 def classify_soil_type(result: dict) -> dict:
     """Classify ASRIS soil type into our categories and add appropriate warnings."""
-    soil_type_lower = result["soil_type"].lower()
-    
-    # Classification based on common ASRIS soil type names
-    if any(x in soil_type_lower for x in ["limestone", "calcareous", "calcrete"]):
-        category = "limestone"
-    elif any(x in soil_type_lower for x in ["granite", "laterite", "rock", "ironstone"]):
-        category = "rock"
-    elif any(x in soil_type_lower for x in ["vertosol", "cracking clay", "black soil"]):
-        category = "reactive_clay"
-    elif any(x in soil_type_lower for x in ["clay", "sodosol"]):
-        category = "heavy_clay"
-    elif any(x in soil_type_lower for x in ["peat", "hydrosol", "wetland"]):
-        category = "peat"
-    elif any(x in soil_type_lower for x in ["sand", "arenosol", "podosol"]):
-        category = "sand"
-    elif any(x in soil_type_lower for x in ["loam", "dermosol", "chromosol"]):
-        category = "loam"
-    else:
-        category = "loam"  # Default to safe
-    
+    # Keyword rules are data (see soil_classifier); unmatched names get the rules' default
+    # category and are flagged so they can be reviewed and added to the vocabulary.
+    category, matched = soil_classifier.classify(result["soil_type"])
+    result["soil_category_matched"] = matched
+    _apply_category(result, category)
+    return result
+
+
+def _apply_category(result: dict, category: str) -> None:
     soil_info = SOIL_WARNINGS.get(category, {})
     result["soil_category"] = category
     result["warning"] = soil_info.get("warning", "")
     result["equipment"] = soil_info.get("equipment", [])
     result["severity"] = soil_info.get("severity", "none")
     result["is_limestone"] = category in ["limestone", "sand_over_limestone", "rock"]
-    
-    return result
+
+
+def _match_zone(lat: float, lng: float) -> tuple[dict | None, str | None]:
+    """Return (zone, cached ASRIS category) for a point, using the soil raster when available."""
+    code = lookup_code(lat, lng, _raster_fingerprint())
+    if code is not None and code != BOUNDARY_CODE:
+        if code >= ASRIS_CODE_OFFSET:
+            return None, _SOIL_CATEGORIES[code - ASRIS_CODE_OFFSET]
+        return (WA_GEOLOGICAL_ZONES[code - 1] if code else None), None
+
+    # No raster built for this site yet (or the point's cell straddles a zone edge) - exact
+    # scan of the zone table.
+    for zone in WA_GEOLOGICAL_ZONES:
+        if zone["lat_min"] <= lat <= zone["lat_max"] and zone["lng_min"] <= lng <= zone["lng_max"]:
+            return zone, None
+    return None, None
+
+
+def _raster_fingerprint() -> bytes:
+    signature = soil_classifier.rules_signature()
+    fingerprint = _raster_fingerprints.get(signature)
+    if fingerprint is None:
+        fingerprint = _raster_fingerprints[signature] = zones_fingerprint(
+            WA_GEOLOGICAL_ZONES, _SOIL_CATEGORIES, signature
+        )
+    return fingerprint
 
 
 def fetch_asris_soil(lat: float, lng: float) -> dict | None:
-    """Query CSIRO ASRIS API for soil information."""
+    """
+    Query CSIRO ASRIS API for soil information. Returns {} when ASRIS has no data for the
+    point, and None when the lookup failed.
+    """
     try:
         url = f"https://www.asris.csiro.au/ASRISApi/api/ACLEP/getASC?longitude={lng}&latitude={lat}"
         response = requests.get(url, timeout=5)
         if response.status_code == 200:
             data = response.json()
-            if data:
-                return {
-                    "soil_type": data.get("SoilType", data.get("ASCOrder", "")),
-                    "region": data.get("SoilRegion", ""),
-                }
+            if not data:
+                return {}
+            return {
+                "soil_type": data.get("SoilType", data.get("ASCOrder", "")),
+                "region": data.get("SoilRegion", ""),
+            }
     except Exception:
         pass
     return None
@@ -4,7 +4,43 @@ from datetime import date, timedelta
 from typing import Any
 
 import frappe
-from frappe.utils import getdate
+from frappe.query_builder import Order
+from frappe.utils import cint
+
+from probuild.probuild.critical_path import get_critical_paths
+from probuild.probuild.snapshot import (
+    get_snapshot,
+    invalidate_snapshot_group,
+    is_not_modified,
+    make_etag,
+    refresh_snapshot,
+)
+
+BOARD_SNAPSHOT_TTL = 60 * 60
+BOARD_SNAPSHOT_GROUP = "probuild:board"
+DUE_SOON_DAYS = 7
+SECTION_LIMIT = 100
+MAX_SECTION_LIMIT = 500
+
+# section -> (doctype, sort field, descending). Each section is paged by keyset on (sort field, name).
+SECTIONS = {
+    "due_today_tasks": ("Task", "modified", True),
+    "behind_tasks": ("Task", "probuild_due_date", False),
+    "ready_dispatches": ("Dispatch Deliverable", "modified", True),
+    "due_soon_dispatches": ("Dispatch Deliverable", "due_date", False),
+}
+
+TASK_FIELDS = [
+    "name",
+    "subject",
+    "project",
+    "status",
+    "probuild_team",
+    "probuild_planned_date",
+    "exp_end_date",
+    "probuild_due_date",
+]
+DISPATCH_FIELDS = ["name", "deliverable_type", "project", "status", "due_date", "dispatch_method", "job_packet"]
 
 
 def _require_logged_in():
@@ -12,65 +48,176 @@ def _require_logged_in():
         frappe.throw("Login required.")
 
 
-def _task_due_date(t: dict[str, Any]) -> date | None:
-    return getdate(t.get("probuild_planned_date") or t.get("exp_end_date"))
-
-
 @frappe.whitelist()
-def get_board_data() -> dict[str, Any]:
+def get_board_data(
+    team: str | None = None,
+    sections: str | list[str] | None = None,
+    cursor: str | list | None = None,
+    limit: int = SECTION_LIMIT,
+    etag: str | None = None,
+) -> dict[str, Any]:
+    """
+    Board payload for one slice of the shop.
+
+    `team` filters the task sections by probuild_team (dispatches have no team and are not
+    filtered; screens that don't want them leave them out of `sections`). `sections` is a list
+    or comma-separated string of SECTIONS keys, defaulting to all of them.
+
+    Each section returns at most `limit` rows plus `cursors[section]`, the keyset cursor for
+    its next page (None when there is none). Pass that back as `cursor` together with that
+    single section to page through it.
+
+    First pages at the default `limit` are shared by every screen through a Redis snapshot per
+    (team, sections); pass back the previous `etag` to get {"etag", "not_modified": True} when
+    nothing changed. Other page sizes are built per request, so request parameters can't
+    create an unbounded number of snapshots.
+    """
     _require_logged_in()
-
-    today = date.today()
-    soon = today + timedelta(days=7)
-
-    tasks = frappe.get_all(
-        "Task",
-        filters={"status": ["not in", ["Completed", "Cancelled"]]},
-        fields=[
-            "name",
-            "subject",
-            "project",
-            "status",
-            "probuild_team",
-            "probuild_planned_date",
-            "exp_end_date",
-        ],
-        order_by="modified desc",
-        limit=500,
+    team = team or None
+    if team and team not in get_board_teams():
+        frappe.throw("Unknown team.")
+    sections = _parse_sections(sections)
+    limit = min(max(cint(limit) or SECTION_LIMIT, 1), MAX_SECTION_LIMIT)
+
+    if cursor or limit != SECTION_LIMIT:
+        if cursor and len(sections) != 1:
+            frappe.throw("A cursor can only be used with a single section.")
+        data = _build_board_data(team, sections, limit, after=frappe.parse_json(cursor) if cursor else None)
+        if cursor:
+            return data
+        view_etag = make_etag(data)
+        if is_not_modified(view_etag, etag):
+            return {"etag": view_etag, "not_modified": True}
+        return {**data, "etag": view_etag}
+
+    snapshot = get_board_snapshot(team, sections, limit)
+    if is_not_modified(snapshot["etag"], etag):
+        return {"etag": snapshot["etag"], "version": snapshot["version"], "not_modified": True}
+    return {**snapshot["data"], "etag": snapshot["etag"], "version": snapshot["version"]}
+
+
+def get_board_snapshot(
+    team: str | None = None, sections: list[str] | None = None, limit: int = SECTION_LIMIT
+) -> dict[str, Any]:
+    sections = sections or list(SECTIONS)
+    return get_snapshot(
+        _board_snapshot_key(team, sections, limit),
+        lambda: _build_board_data(team, sections, limit),
+        expires_in_sec=BOARD_SNAPSHOT_TTL,
+        group=BOARD_SNAPSHOT_GROUP,
     )
 
-    due_today = []
-    behind = []
-    for t in tasks:
-        d = _task_due_date(t)
-        if not d:
-            continue
-        if d == today:
-            due_today.append({**t, "due_date": d})
-        elif d < today:
-            behind.append({**t, "due_date": d})
-
-    dispatches = frappe.get_all(
-        "Dispatch Deliverable",
-        filters={"status": ["not in", ["Cancelled"]]},
-        fields=["name", "deliverable_type", "project", "status", "due_date", "dispatch_method", "job_packet"],
-        order_by="modified desc",
-        limit=500,
-    )
 
-    ready = [d for d in dispatches if d.get("status") == "Ready"]
-    due_soon = []
-    for d in dispatches:
-        dd = getdate(d.get("due_date"))
-        if dd and today <= dd <= soon:
-            due_soon.append(d)
+def invalidate_board_snapshot() -> None:
+    invalidate_snapshot_group(BOARD_SNAPSHOT_GROUP)
+
+
+def rebuild_board_snapshot() -> None:
+    """
+    Scheduler: keep the whole-shop and per-team snapshots warm so no screen pays for the
+    rebuild, and pick up changes made by bulk SQL updates that bypass doc events.
+    """
+    sections = list(SECTIONS)
+    for team in [None, *get_board_teams()]:
+        refresh_snapshot(
+            _board_snapshot_key(team, sections, SECTION_LIMIT),
+            lambda team=team: _build_board_data(team, sections, SECTION_LIMIT),
+            expires_in_sec=BOARD_SNAPSHOT_TTL,
+            group=BOARD_SNAPSHOT_GROUP,
+        )
 
-    return {
-        "today": str(today),
-        "due_today_tasks": due_today[:100],
-        "behind_tasks": behind[:100],
-        "ready_dispatches": ready[:100],
-        "due_soon_dispatches": due_soon[:100],
-    }
 
+def _board_snapshot_key(team: str | None, sections: list[str], limit: int) -> str:
+    # Keyed by day so "today"/"behind" roll over at midnight without an invalidation.
+    return f"probuild:board:{date.today()}:{team or '*'}:{','.join(sections)}:{limit}"
 
+
+def get_board_teams() -> list[str]:
+    options = frappe.get_meta("Task").get_field("probuild_team").options or ""
+    return [o for o in options.split("\n") if o]
+
+
+def _parse_sections(sections: str | list[str] | None) -> list[str]:
+    if not sections:
+        return list(SECTIONS)
+    if isinstance(sections, str):
+        sections = frappe.parse_json(sections) if sections.startswith("[") else sections.split(",")
+    sections = [s.strip() for s in sections if s and s.strip()]
+    unknown = [s for s in sections if s not in SECTIONS]
+    if unknown:
+        frappe.throw(f"Unknown board section(s): {', '.join(unknown)}")
+    # Canonical order, so equivalent requests share a snapshot.
+    return [s for s in SECTIONS if s in sections]
+
+
+def _build_board_data(
+    team: str | None, sections: list[str], limit: int, after: list | None = None
+) -> dict[str, Any]:
+    today = date.today()
+    data: dict[str, Any] = {"today": str(today), "team": team, "cursors": {}}
+    for section in sections:
+        rows, data["cursors"][section] = _query_section(section, today, team, limit, after)
+        data[section] = rows
+
+    # Flag tasks on their project's critical path (cached per project, fetched in bulk).
+    task_rows = [r for section in sections if SECTIONS[section][0] == "Task" for r in data[section]]
+    paths = get_critical_paths([r["project"] for r in task_rows if r.get("project")])
+    for r in task_rows:
+        info = paths.get(r.get("project"), {}).get("tasks", {}).get(r["name"])
+        r["critical"] = bool(info and info["critical"])
+        r["slack_hours"] = info["slack"] if info else None
+    return data
+
+
+def _query_section(
+    section: str, today: date, team: str | None, limit: int, after: list | None
+) -> tuple[list[dict[str, Any]], list | None]:
+    """
+    One indexed query per section, filtered, ordered and limited in SQL on the stored due
+    dates (Task.probuild_due_date, Dispatch Deliverable.due_date), paged by keyset on
+    (sort field, name).
+    """
+    doctype, sort_field, descending = SECTIONS[section]
+    table = frappe.qb.DocType(doctype)
+    is_task = doctype == "Task"
+    fields = TASK_FIELDS if is_task else DISPATCH_FIELDS
+
+    query = frappe.qb.from_(table).select(*[table[f] for f in fields])
+    if sort_field not in fields:
+        query = query.select(table[sort_field])
+
+    if is_task:
+        query = query.where(table.status.notin(["Completed", "Cancelled"]))
+        if team:
+            query = query.where(table.probuild_team == team)
+
+    if section == "due_today_tasks":
+        query = query.where(table.probuild_due_date == today)
+    elif section == "behind_tasks":
+        query = query.where(table.probuild_due_date < today)
+    elif section == "ready_dispatches":
+        query = query.where(table.status == "Ready")
+    elif section == "due_soon_dispatches":
+        query = query.where(table.status != "Cancelled").where(
+            table.due_date.between(today, today + timedelta(days=DUE_SOON_DAYS))
+        )
+
+    key = table[sort_field]
+    if after:
+        after_value, after_name = after
+        if descending:
+            query = query.where((key < after_value) | ((key == after_value) & (table.name < after_name)))
+        else:
+            query = query.where((key > after_value) | ((key == after_value) & (table.name > after_name)))
+
+    order = Order.desc if descending else Order.asc
+    rows = query.orderby(key, order=order).orderby(table.name, order=order).limit(limit + 1).run(as_dict=True)
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = [str(rows[-1][sort_field]), rows[-1]["name"]]
+
+    if is_task:
+        rows = [{**r, "due_date": r["probuild_due_date"]} for r in rows]
+    return rows, next_cursor
@@ -0,0 +1,154 @@
+from __future__ import annotations
+
+from collections import defaultdict
+from typing import Any
+
+import frappe
+from frappe.utils import flt
+
+# Material availability net of Job Material Allocations that are not issued yet.
+#
+# Two grouped queries, whatever the number of allocations or lines:
+#
+#   - on hand: Bin.actual_qty per (item, warehouse);
+#   - reserved: Draft / Allocated allocation lines per (item, warehouse), converted to the
+#     item's stock UOM. A line's warehouse falls back to its allocation's.
+#
+# available = on hand - reserved. Warehouse None holds the item's totals across warehouses (all
+# stock, all reservations); lines without any warehouse are checked against it.
+
+RESERVING_STATUSES = ("Draft", "Allocated")
+NO_STOCK = {"actual_qty": 0.0, "reserved_qty": 0.0, "available_qty": 0.0}
+
+
+def get_net_availability(
+    items: list[str] | None = None, exclude_allocation: str | None = None
+) -> dict[tuple[str, str | None], dict[str, float]]:
+    """
+    {(item, warehouse): {"actual_qty", "reserved_qty", "available_qty"}} for every pair with
+    stock or reservations, plus (item, None) totals (limited to `items` if given).
+    `exclude_allocation` leaves one allocation's own lines out of the reservations.
+    """
+    if items is not None and not items:
+        return {}
+
+    actual = _with_totals(_on_hand(items))
+    reserved = _with_totals(_reserved(items, exclude_allocation))
+
+    out = {}
+    for key in actual.keys() | reserved.keys():
+        on_hand = actual.get(key, 0.0)
+        held = reserved.get(key, 0.0)
+        out[key] = {"actual_qty": on_hand, "reserved_qty": held, "available_qty": on_hand - held}
+    return out
+
+
+def get_allocation_shortfalls(allocation: str | None = None) -> list[dict[str, Any]]:
+    """
+    Shortfalls for one allocation (its demand against stock left after every other pending
+    allocation) or, without `allocation`, for the whole Draft / Allocated pipeline.
+
+    Rows: {"item_code", "warehouse", "required_qty", "actual_qty", "reserved_qty",
+    "available_qty", "shortfall", "allocations"}, largest shortfall first.
+    """
+    if allocation:
+        demand = _reserved_by_allocation(allocation)
+        availability = get_net_availability(_items(demand), exclude_allocation=allocation)
+        allocations = {key: [allocation] for key in demand}
+    else:
+        demand = _reserved(None)
+        availability = get_net_availability(_items(demand))
+        allocations = _pipeline_allocations()
+
+    rows = []
+    for key, required in demand.items():
+        stock = availability.get(key, NO_STOCK)
+        # For one allocation the reservations are everyone else's, so what it needs must fit in
+        # what they leave; for the pipeline the demand is the reservations themselves.
+        shortfall = required - stock["available_qty"] if allocation else -stock["available_qty"]
+        if shortfall <= 0:
+            continue
+        rows.append(
+            {
+                "item_code": key[0],
+                "warehouse": key[1],
+                "required_qty": required,
+                **stock,
+                "shortfall": shortfall,
+                "allocations": allocations.get(key, []),
+            }
+        )
+    rows.sort(key=lambda r: -r["shortfall"])
+    return rows
+
+
+def _on_hand(items: list[str] | None) -> dict[tuple[str, str | None], float]:
+    condition = "where item_code in %(items)s" if items is not None else ""
+    return {
+        (item_code, warehouse): flt(qty)
+        for item_code, warehouse, qty in frappe.db.sql(
+            f"""
+            select item_code, warehouse, sum(actual_qty)
+            from `tabBin`
+            {condition}
+            group by item_code, warehouse
+            """,
+            {"items": tuple(items or ())},
+        )
+    }
+
+
+def _reserved(items: list[str] | None, exclude_allocation: str | None = None) -> dict[tuple[str, str | None], float]:
+    conditions = ["a.status in %(statuses)s"]
+    if items is not None:
+        conditions.append("i.item_code in %(items)s")
+    if exclude_allocation:
+        conditions.append("a.name != %(exclude)s")
+    rows = _grouped_lines(conditions, {"items": tuple(items or ()), "exclude": exclude_allocation})
+    return {(item_code, warehouse): flt(qty) for item_code, warehouse, qty in rows}
+
+
+def _reserved_by_allocation(allocation: str) -> dict[tuple[str, str | None], float]:
+    # Counted whatever its status, so a draft can be checked before it is allocated.
+    rows = _grouped_lines(["a.name = %(allocation)s"], {"allocation": allocation})
+    return {(item_code, warehouse): flt(qty) for item_code, warehouse, qty in rows}
+
+
+def _pipeline_allocations() -> dict[tuple[str, str | None], list[str]]:
+    out: dict[tuple[str, str | None], list[str]] = defaultdict(list)
+    for item_code, warehouse, name, _qty in _grouped_lines(["a.status in %(statuses)s"], {}, by_allocation=True):
+        out[(item_code, warehouse)].append(name)
+    return out
+
+
+def _grouped_lines(conditions: list[str], values: dict, by_allocation: bool = False) -> list[tuple]:
+    """Allocation line qty in stock UOM, summed per (item, warehouse[, allocation])."""
+    allocation_column = ", a.name" if by_allocation else ""
+    return frappe.db.sql(
+        f"""
+        select i.item_code, coalesce(i.warehouse, a.warehouse) as line_warehouse{allocation_column},
+            sum(i.qty * coalesce(ucd.conversion_factor, 1))
+        from `tabJob Material Allocation Item` i
+        join `tabJob Material Allocation` a on a.name = i.parent
+        join `tabItem` it on it.name = i.item_code
+        left join `tabUOM Conversion Detail` ucd
+            on ucd.parent = i.item_code and ucd.parenttype = 'Item'
+            and ucd.uom = i.uom and i.uom != it.stock_uom
+        where i.parenttype = 'Job Material Allocation' and {" and ".join(conditions)}
+        group by i.item_code, line_warehouse{allocation_column}
+        order by i.item_code, line_warehouse{allocation_column}
+        """,
+        {**values, "statuses": RESERVING_STATUSES},
+    )
+
+
+def _with_totals(qty: dict[tuple[str, str | None], float]) -> dict[tuple[str, str | None], float]:
+    out: dict[tuple[str, str | None], float] = defaultdict(float, qty)
+    for (item_code, warehouse), value in qty.items():
+        if warehouse is not None:
+            out[(item_code, None)] += value
+    return out
+
+
+def _items(demand: dict[tuple[str, str | None], float]) -> list[str]:
+    return list({item for item, _warehouse in demand})
@@ -0,0 +1,169 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+from datetime import date, timedelta
+from typing import Any
+
+import frappe
+import numpy as np
+from frappe.utils import getdate
+
+# Multi-team capacity forecast.
+#
+# Capacity (from each team's active Capacity Profile) and planned load (open Task hours on
+# their effective due date) are loaded into float arrays shaped (teams, days) and every
+# derived series is computed in one vectorized pass:
+#
+#   variance = capacity - load
+#   backlog  = hours still outstanding at the end of each day, carrying overdue work forward
+#              (B[t] = max(0, B[t-1] + load[t] - capacity[t]), starting from the hours
+#              already overdue before the first day)
+
+WEEKDAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+DEFAULT_FORECAST_DAYS = 90
+MAX_FORECAST_DAYS = 366
+OPEN_TASK_STATUSES_EXCLUDED = ("Completed", "Cancelled")
+
+
+@dataclass
+class CapacityForecast:
+    from_date: date
+    teams: list[str]
+    capacity: np.ndarray  # (teams, days)
+    load: np.ndarray  # (teams, days)
+    task_counts: np.ndarray  # (teams, days)
+    opening_backlog: np.ndarray  # (teams,) hours overdue before from_date
+
+    @property
+    def days(self) -> list[date]:
+        return [self.from_date + timedelta(days=i) for i in range(self.capacity.shape[1])]
+
+    @property
+    def variance(self) -> np.ndarray:
+        return self.capacity - self.load
+
+    @property
+    def backlog(self) -> np.ndarray:
+        # Closed form of the carry-forward recursion: running balance minus its running
+        # minimum (clamped at zero), so days with spare capacity absorb earlier backlog.
+        balance = self.opening_backlog[:, None] + np.cumsum(self.load - self.capacity, axis=1)
+        return balance - np.minimum(np.minimum.accumulate(balance, axis=1), 0)
+
+    @property
+    def utilisation(self) -> np.ndarray:
+        # Load as a fraction of capacity; NaN on days with no capacity at all.
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return np.where(self.capacity > 0, self.load / self.capacity, np.nan)
+
+    def as_dict(self) -> dict[str, Any]:
+        def rounded(a: np.ndarray) -> list[list[float | None]]:
+            return [[None if np.isnan(v) else round(float(v), 2) for v in row] for row in a]
+
+        return {
+            "from_date": str(self.from_date),
+            "days": [str(d) for d in self.days],
+            "teams": self.teams,
+            "capacity": rounded(self.capacity),
+            "load": rounded(self.load),
+            "variance": rounded(self.variance),
+            "backlog": rounded(self.backlog),
+            "utilisation": rounded(self.utilisation),
+            "tasks": self.task_counts.astype(int).tolist(),
+            "opening_backlog": [round(float(v), 2) for v in self.opening_backlog],
+        }
+
+
+def build_forecast(
+    from_date: date | str | None = None, days: int = DEFAULT_FORECAST_DAYS, teams: list[str] | None = None
+) -> CapacityForecast:
+    """Forecast every team with an active Capacity Profile or planned work (or just `teams`)."""
+    from_date = getdate(from_date or date.today())
+    days = min(max(int(days or DEFAULT_FORECAST_DAYS), 1), MAX_FORECAST_DAYS)
+    to_date = from_date + timedelta(days=days - 1)
+
+    weekday_hours = get_team_weekday_hours()
+    planned = _get_planned_hours(from_date, to_date)
+    overdue = _get_overdue_hours(from_date)
+
+    if teams is None:
+        teams = sorted(set(weekday_hours) | {r.team for r in planned} | set(overdue))
+    team_index = {team: i for i, team in enumerate(teams)}
+
+    # Capacity: (teams, 7) weekday table gathered onto each forecast day's weekday.
+    hours_by_weekday = np.array([weekday_hours.get(team, [0.0] * 7) for team in teams], dtype=float).reshape(
+        len(teams), 7
+    )
+    day_weekdays = (np.arange(days) + from_date.weekday()) % 7
+    capacity = hours_by_weekday[:, day_weekdays]
+
+    load = np.zeros((len(teams), days))
+    task_counts = np.zeros((len(teams), days))
+    rows = [r for r in planned if r.team in team_index]
+    if rows:
+        team_idx = np.array([team_index[r.team] for r in rows])
+        day_idx = np.array([(getdate(r.day) - from_date).days for r in rows])
+        np.add.at(load, (team_idx, day_idx), np.array([float(r.hours or 0) for r in rows]))
+        np.add.at(task_counts, (team_idx, day_idx), np.array([int(r.tasks or 0) for r in rows]))
+
+    opening_backlog = np.array([overdue.get(team, 0.0) for team in teams], dtype=float)
+    return CapacityForecast(from_date, teams, capacity, load, task_counts, opening_backlog)
+
+
+def get_team_weekday_hours() -> dict[str, list[float]]:
+    """team -> capacity hours for Monday..Sunday, from each team's active Capacity Profile."""
+    rows = frappe.db.sql(
+        """
+        select cp.team as team, cpd.weekday as weekday, sum(cpd.total_hours) as hours
+        from `tabCapacity Profile` cp
+        join `tabCapacity Profile Day` cpd
+            on cpd.parent = cp.name and cpd.parenttype = 'Capacity Profile'
+        where cp.active = 1
+            and cp.name = (
+                select latest.name from `tabCapacity Profile` latest
+                where latest.team = cp.team and latest.active = 1
+                order by latest.modified desc
+                limit 1
+            )
+        group by cp.team, cpd.weekday
+        """,
+        as_dict=True,
+    )
+    out: dict[str, list[float]] = {}
+    for r in rows:
+        if r.weekday in WEEKDAYS:
+            out.setdefault(r.team, [0.0] * 7)[WEEKDAYS.index(r.weekday)] = float(r.hours or 0)
+    return out
+
+
+def _get_planned_hours(from_date: date, to_date: date) -> list[dict[str, Any]]:
+    return frappe.get_all(
+        "Task",
+        filters={
+            "probuild_team": ["is", "set"],
+            "probuild_due_date": ["between", [from_date, to_date]],
+            "status": ["not in", OPEN_TASK_STATUSES_EXCLUDED],
+            "expected_time": [">", 0],
+        },
+        fields=[
+            "probuild_team as team",
+            "probuild_due_date as day",
+            "sum(expected_time) as hours",
+            "count(name) as tasks",
+        ],
+        group_by="probuild_team, probuild_due_date",
+    )
+
+
+def _get_overdue_hours(from_date: date) -> dict[str, float]:
+    rows = frappe.get_all(
+        "Task",
+        filters={
+            "probuild_team": ["is", "set"],
+            "probuild_due_date": ["<", from_date],
+            "status": ["not in", OPEN_TASK_STATUSES_EXCLUDED],
+            "expected_time": [">", 0],
+        },
+        fields=["probuild_team as team", "sum(expected_time) as hours"],
+        group_by="probuild_team",
+    )
+    return {r.team: float(r.hours or 0) for r in rows}
@@ -0,0 +1,138 @@
+from __future__ import annotations
+
+from collections import defaultdict
+from typing import Any
+
+import frappe
+from frappe.utils import flt
+
+# Critical path (CPM) per Project over the Task.depends_on graph.
+#
+# Durations are Task.expected_time hours; completed tasks count as zero so they never hold
+# anything up, and cancelled tasks are left out. One forward and one backward pass in
+# topological order give, per task, earliest/latest start and finish (hours from the start of
+# the project's remaining work) and slack. Open tasks with no slack are critical.
+#
+# Results are cached per project in a Redis hash and dropped whenever a task in that project
+# changes (events.task_on_change).
+
+CACHE_KEY = "probuild:critical_path"
+SLACK_EPSILON = 1e-6
+
+
+def get_critical_paths(projects: list[str]) -> dict[str, dict[str, Any]]:
+    """
+    {project: {"duration_hours", "critical_path": [task, ...], "cycle": [task, ...],
+    "tasks": {task: {"es", "ef", "ls", "lf", "slack", "critical"}}}}, computing (in bulk) and
+    caching the projects that aren't cached yet.
+    """
+    projects = [p for p in dict.fromkeys(projects) if p]
+    out: dict[str, dict[str, Any]] = {}
+    missing = []
+    for project in projects:
+        cached = frappe.cache.hget(CACHE_KEY, project)
+        if cached is None:
+            missing.append(project)
+        else:
+            out[project] = cached
+
+    if missing:
+        for project, result in _compute(missing).items():
+            frappe.cache.hset(CACHE_KEY, project, result)
+            out[project] = result
+    return out
+
+
+def get_critical_path(project: str) -> dict[str, Any]:
+    return get_critical_paths([project])[project]
+
+
+def invalidate_critical_path(*projects: str | None) -> None:
+    for project in projects:
+        if project:
+            frappe.cache.hdel(CACHE_KEY, project)
+
+
+def _compute(projects: list[str]) -> dict[str, dict[str, Any]]:
+    tasks = frappe.get_all(
+        "Task",
+        filters={"project": ["in", projects], "status": ["not in", ["Cancelled", "Template"]]},
+        fields=["name", "project", "status", "expected_time"],
+    )
+    by_project: dict[str, dict[str, dict]] = {p: {} for p in projects}
+    for t in tasks:
+        by_project[t.project][t.name] = t
+
+    edges: dict[str, list[tuple[str, str]]] = defaultdict(list)
+    if tasks:
+        for project, parent, dep in frappe.db.sql(
+            """
+            select t.project, d.parent, d.task
+            from `tabTask Depends On` d
+            join `tabTask` t on t.name = d.parent
+            where d.parenttype = 'Task' and t.project in %(projects)s
+            """,
+            {"projects": tuple(projects)},
+        ):
+            edges[project].append((dep, parent))
+
+    return {project: _critical_path(by_project[project], edges[project]) for project in projects}
+
+
+def _critical_path(tasks: dict[str, dict], edges: list[tuple[str, str]]) -> dict[str, Any]:
+    duration = {name: 0.0 if t.status == "Completed" else flt(t.expected_time) for name, t in tasks.items()}
+    successors: dict[str, list[str]] = {name: [] for name in tasks}
+    predecessors: dict[str, list[str]] = {name: [] for name in tasks}
+    for dep, task in edges:
+        # Dependencies on tasks outside the project (or cancelled) don't constrain it here.
+        if dep in tasks and task in tasks and dep != task:
+            successors[dep].append(task)
+            predecessors[task].append(dep)
+
+    indegree = {name: len(preds) for name, preds in predecessors.items()}
+    order = [name for name, n in indegree.items() if not n]
+    for name in order:
+        for succ in successors[name]:
+            indegree[succ] -= 1
+            if not indegree[succ]:
+                order.append(succ)
+    cycle = sorted(name for name, n in indegree.items() if n)
+
+    es: dict[str, float] = {}
+    for name in order:
+        es[name] = max((es[p] + duration[p] for p in predecessors[name] if p in es), default=0.0)
+    end = max((es[name] + duration[name] for name in order), default=0.0)
+
+    lf: dict[str, float] = {}
+    for name in reversed(order):
+        lf[name] = min((lf[s] - duration[s] for s in successors[name] if s in lf), default=end)
+
+    result_tasks = {}
+    for name in order:
+        ls = lf[name] - duration[name]
+        slack = ls - es[name]
+        result_tasks[name] = {
+            "es": es[name],
+            "ef": es[name] + duration[name],
+            "ls": ls,
+            "lf": lf[name],
+            "slack": round(slack, 4),
+            "critical": slack <= SLACK_EPSILON and tasks[name].status != "Completed",
+        }
+
+    # Walk one critical chain from a critical start task to the project end.
+    path = []
+    current = next((n for n in order if result_tasks[n]["critical"] and not result_tasks[n]["es"]), None)
+    while current:
+        path.append(current)
+        current = next(
+            (
+                s
+                for s in successors[current]
+                if result_tasks.get(s, {}).get("critical")
+                and abs(result_tasks[s]["es"] - result_tasks[current]["ef"]) <= SLACK_EPSILON
+            ),
+            None,
+        )
+
+    return {"duration_hours": end, "critical_path": path, "cycle": cycle, "tasks": result_tasks}
@@ -1,7 +1,18 @@
 from __future__ import annotations
 
+from functools import partial
+
 import frappe
 from frappe.model.document import Document
+from frappe.utils import cint, now_datetime
+
+from probuild.probuild.api.kiosk import invalidate_open_tasks_snapshot
+from probuild.probuild.api.wallboard import invalidate_board_snapshot
+from probuild.probuild.critical_path import invalidate_critical_path
+from probuild.probuild.doctype.task_template.task_template import get_template_plan
+from probuild.probuild.reference import reserve_names
+from probuild.probuild.shopfloor import publish_rows
+from probuild.probuild.task_scheduler import enqueue_task_scheduling
 
 
 class JobPacket(Document):
@@ -18,14 +29,10 @@ class JobPacket(Document):
         if getattr(self, "tasks_generated", 0):
             return
 
-        project = self._resolve_project()
-        tasks = _create_tasks_for_job_packet(self, project=project)
-        if self.job_type == "Supply Only":
-            _create_supply_only_dispatches(self, project=project)
-            self.db_set("dispatch_generated", 1, update_modified=False)
-
-        if tasks:
-            self.db_set("tasks_generated", 1, update_modified=False)
+        # Checked here so the approver sees the error; the rest runs in the background.
+        self._resolve_project()
+        self.db_set({"approval_status": "Queued", "approval_error": None}, update_modified=False)
+        enqueue_approval(self.name, self.revision)
 
     def _resolve_project(self) -> str:
         if self.project:
@@ -39,37 +46,224 @@ class JobPacket(Document):
         frappe.throw("Job Packet must be linked to a Project (or a Sales Order with a Project) before approval.")
 
 
+def enqueue_approval(job_packet: str, revision: int | None) -> None:
+    frappe.enqueue(
+        "probuild.probuild.doctype.job_packet.job_packet.process_approval",
+        queue="long",
+        job_id=f"job_packet_approval::{job_packet}::{revision}",
+        deduplicate=True,
+        enqueue_after_commit=True,
+        job_packet=job_packet,
+        revision=revision,
+    )
+
+
+def process_approval(job_packet: str, revision: int | None = None) -> None:
+    """
+    Background job: generate the approved packet's tasks (and supply-only dispatches).
+
+    Idempotent: the packet row is locked for the duration and anything already generated for
+    it is skipped, so retries and duplicate jobs never create a second set.
+    """
+    current = frappe.db.get_value(
+        "Job Packet", job_packet, ["status", "revision", "approval_status"], as_dict=True, for_update=True
+    )
+    if not current or current.status != "Approved":
+        return
+    if revision is not None and cint(current.revision) != cint(revision):
+        # Superseded by a newer revision; that revision's job does the work.
+        return
+
+    doc = frappe.get_doc("Job Packet", job_packet)
+    try:
+        project = doc._resolve_project()
+        updates = {"approval_status": "Completed", "approval_error": None}
+
+        if not frappe.db.exists("Task", {"probuild_job_packet": doc.name}):
+            if _create_tasks_for_job_packet(doc, project=project):
+                # Give the new chain planned dates against team capacity once it is committed.
+                enqueue_task_scheduling()
+        updates["tasks_generated"] = 1
+
+        if get_template_plan(doc.job_type)["create_dispatches"]:
+            if not frappe.db.exists("Dispatch Deliverable", {"job_packet": doc.name}):
+                _create_supply_only_dispatches(doc, project=project)
+            updates["dispatch_generated"] = 1
+
+        doc.db_set(updates, update_modified=False, notify=True)
+    except Exception as e:
+        frappe.db.rollback()
+        frappe.db.set_value(
+            "Job Packet",
+            job_packet,
+            {"approval_status": "Failed", "approval_error": str(e) or repr(e)},
+            update_modified=False,
+        )
+        frappe.db.commit()
+        frappe.get_doc("Job Packet", job_packet).notify_update()
+        raise
+
+
+@frappe.whitelist()
+def retry_approval(job_packet: str) -> None:
+    doc = frappe.get_doc("Job Packet", job_packet)
+    doc.check_permission("write")
+    if doc.status != "Approved" or doc.approval_status != "Failed":
+        frappe.throw("Only approved Job Packets whose approval failed can be retried.")
+    doc.db_set({"approval_status": "Queued", "approval_error": None}, update_modified=False, notify=True)
+    enqueue_approval(doc.name, doc.revision)
+
+
+TASK_FIELDS = (
+    "name",
+    "creation",
+    "modified",
+    "owner",
+    "modified_by",
+    "docstatus",
+    "project",
+    "company",
+    "subject",
+    "status",
+    "probuild_team",
+    "expected_time",
+    "probuild_job_packet",
+    "probuild_template_key",
+    "depends_on_tasks",
+    "lft",
+    "rgt",
+    "is_group",
+)
+DEPENDS_ON_FIELDS = (
+    "name",
+    "creation",
+    "modified",
+    "owner",
+    "modified_by",
+    "docstatus",
+    "parent",
+    "parenttype",
+    "parentfield",
+    "idx",
+    "task",
+    "subject",
+    "project",
+)
+
+
 def _create_tasks_for_job_packet(job_packet: JobPacket, project: str) -> list[str]:
-    templates = _get_task_template(job_packet.job_type)
-    created: dict[str, str] = {}
+    """
+    Expand the job type's template into Tasks and their dependencies in one pass: names are
+    reserved up front, so Task and Task Depends On rows can be bulk-inserted together instead
+    of inserting each Task and re-saving it to add dependencies.
+    """
+    # Compiled, cached and already validated as a DAG in dependency order (see Task Template).
+    templates = get_template_plan(job_packet.job_type)["steps"]
+    if not templates:
+        return []
 
-    for t in templates:
-        task = frappe.get_doc(
-            {
-                "doctype": "Task",
-                "project": project,
-                "subject": t["subject"],
-                "status": "Open",
-                "probuild_team": t.get("team"),
-            }
+    names = reserve_names("Task", len(templates))
+    created = {t["key"]: name for t, name in zip(templates, names, strict=True)}
+    subjects = {t["key"]: t["subject"] for t in templates}
+
+    now = now_datetime()
+    user = frappe.session.user
+    company = frappe.db.get_value("Project", project, "company")
+    # New root nodes in Task's nested set, appended after the current last node. The locking
+    # read holds the top of the rgt index until commit, so concurrent approvals (and other
+    # locking readers of it) take their ranges one after another instead of overlapping.
+    last = frappe.db.sql("select rgt from `tabTask` order by rgt desc limit 1 for update")
+    max_rgt = cint(last[0][0]) if last else 0
+
+    task_rows = []
+    depends_on_rows = []
+    for i, t in enumerate(templates):
+        name = created[t["key"]]
+        dep_keys = t["depends_on"]
+        lft = max_rgt + 1 + 2 * i
+        task_rows.append(
+            (
+                name,
+                now,
+                now,
+                user,
+                user,
+                0,
+                project,
+                company,
+                t["subject"],
+                "Open",
+                t["team"],
+                t["hours"],
+                job_packet.name,
+                t["key"],
+                "".join(f"{created[k]}," for k in dep_keys),
+                lft,
+                lft + 1,
+                0,
+            )
         )
-        task.insert(ignore_permissions=True)
-        created[t["key"]] = task.name
+        for idx, dep_key in enumerate(dep_keys, start=1):
+            depends_on_rows.append(
+                (
+                    frappe.generate_hash(length=10),
+                    now,
+                    now,
+                    user,
+                    user,
+                    0,
+                    name,
+                    "Task",
+                    "depends_on",
+                    idx,
+                    created[dep_key],
+                    subjects[dep_key],
+                    project,
+                )
+            )
+
+    frappe.db.bulk_insert("Task", TASK_FIELDS, task_rows)
+    if depends_on_rows:
+        frappe.db.bulk_insert("Task Depends On", DEPENDS_ON_FIELDS, depends_on_rows)
+
+    _after_bulk_task_insert(project, [dict(zip(TASK_FIELDS, row, strict=True)) for row in task_rows])
+    return names
 
-    # Add dependencies after tasks exist
-    for t in templates:
-        depends_on = t.get("depends_on", [])
-        if not depends_on:
-            continue
-        task_name = created[t["key"]]
-        task = frappe.get_doc("Task", task_name)
-        for dep_key in depends_on:
-            if dep_key not in created:
-                continue
-            task.append("depends_on", {"task": created[dep_key]})
-        task.save(ignore_permissions=True)
 
-    return list(created.values())
+def _after_bulk_task_insert(project: str, rows: list[dict]) -> None:
+    # What Task.on_update would have done once per task: project progress, cached views
+    # (including the project's critical path) and shop-floor screens.
+    frappe.get_doc("Project", project).update_project()
+    frappe.db.after_commit.add(invalidate_open_tasks_snapshot)
+    frappe.db.after_commit.add(invalidate_board_snapshot)
+    frappe.db.after_commit.add(partial(invalidate_critical_path, project))
+    publish_rows("Task", rows)
+
+
+@frappe.whitelist()
+def approve_job_packets(names: str | list[str]) -> dict[str, list]:
+    """
+    Approve many Job Packets at once (e.g. importing a backlog). Each packet is approved in
+    its own savepoint, so one failure doesn't undo the others; task generation then runs in
+    each packet's background approval job.
+    """
+    names = frappe.parse_json(names) if isinstance(names, str) else names
+    approved, failed = [], []
+    for name in names:
+        frappe.db.savepoint("approve_job_packet")
+        try:
+            doc = frappe.get_doc("Job Packet", name)
+            if doc.status != "Approved":
+                doc.status = "Approved"
+                doc.approved_by = frappe.session.user
+                doc.approved_on = now_datetime()
+                doc.save()
+            approved.append(name)
+        except (frappe.ValidationError, frappe.PermissionError) as e:
+            frappe.db.rollback(save_point="approve_job_packet")
+            frappe.clear_last_message()
+            failed.append({"name": name, "error": str(e)})
+    return {"approved": approved, "failed": failed}
 
 
 def _create_supply_only_dispatches(job_packet: JobPacket, project: str) -> None:
@@ -86,41 +280,3 @@ def _create_supply_only_dispatches(job_packet: JobPacket, project: str) -> None:
             }
         )
         doc.insert(ignore_permissions=True)
-
-
-def _get_task_template(job_type: str) -> list[dict]:
-    if job_type == "Supply Only":
-        return [
-            {"key": "ps1", "subject": "Production Sheet 1", "team": "Production"},
-            {"key": "m_posts", "subject": "Manufacture Posts", "team": "Production", "depends_on": ["ps1"]},
-            {
-                "key": "dispatch_posts",
-                "subject": "Dispatch Posts (Freight/Pickup)",
-                "team": "Production",
-                "depends_on": ["m_posts"],
-            },
-            {"key": "await_measure", "subject": "Await Customer Measurements", "team": "Scheduler", "depends_on": ["dispatch_posts"]},
-            {"key": "ps2", "subject": "Production Sheet 2 (Panels)", "team": "Production", "depends_on": ["await_measure"]},
-            {"key": "m_panels", "subject": "Manufacture Panels", "team": "Production", "depends_on": ["ps2"]},
-            {
-                "key": "dispatch_panels",
-                "subject": "Dispatch Panels (Freight/Pickup)",
-                "team": "Production",
-                "depends_on": ["m_panels"],
-            },
-            {"key": "closeout", "subject": "Closeout", "team": "Scheduler", "depends_on": ["dispatch_panels"]},
-        ]
-
-    # Supply & Install (default)
-    return [
-        {"key": "ps1", "subject": "Production Sheet 1", "team": "Production"},
-        {"key": "m_posts", "subject": "Manufacture Posts", "team": "Production", "depends_on": ["ps1"]},
-        {"key": "i_posts", "subject": "Install Posts", "team": "Installation", "depends_on": ["m_posts"]},
-        {"key": "measure", "subject": "Measure Panels Gap & Confirm", "team": "Installation", "depends_on": ["i_posts"]},
-        {"key": "ps2", "subject": "Production Sheet 2 (Panels)", "team": "Production", "depends_on": ["measure"]},
-        {"key": "m_panels", "subject": "Manufacture Panels", "team": "Production", "depends_on": ["ps2"]},
-        {"key": "i_panels", "subject": "Install Panels", "team": "Installation", "depends_on": ["m_panels"]},
-        {"key": "closeout", "subject": "Closeout", "team": "Scheduler", "depends_on": ["i_panels"]},
-    ]
-
-
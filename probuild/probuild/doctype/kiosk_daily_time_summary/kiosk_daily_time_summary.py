@@ -0,0 +1,133 @@
+from __future__ import annotations
+
+import hashlib
+from datetime import date
+
+import frappe
+from frappe.model.document import Document
+from frappe.utils import getdate, now_datetime
+
+
+class KioskDailyTimeSummary(Document):
+    pass
+
+
+# (summary_date, worker, task, project, duration_seconds, log_count)
+SummaryDelta = tuple[date, str, str, str | None, int, int]
+
+
+def summary_name(summary_date: date, worker: str, task: str, project: str | None) -> str:
+    # Deterministic, so increments can upsert on the primary key. rebuild_kiosk_time_summary
+    # computes the same value in SQL.
+    return hashlib.md5(f"{summary_date}|{worker}|{task}|{project or ''}".encode()).hexdigest()[:20]
+
+
+def apply_summary_deltas(deltas: list[SummaryDelta]) -> None:
+    """Add (or subtract) stopped time to the daily summary and refresh derived hours."""
+    deltas = [d for d in deltas if d[4] or d[5]]
+    if not deltas:
+        return
+
+    now = now_datetime()
+    user = frappe.session.user
+    values = []
+    for summary_date, worker, task, project, seconds, count in deltas:
+        summary_date = getdate(summary_date)
+        values.append(
+            (summary_name(summary_date, worker, task, project), now, now, user, user, summary_date, worker, task, project, seconds, count)
+        )
+
+    frappe.db.sql(
+        """
+        insert into `tabKiosk Daily Time Summary`
+            (name, creation, modified, modified_by, owner, summary_date, worker, task, project, duration_seconds, log_count)
+        values {}
+        on duplicate key update
+            duration_seconds = duration_seconds + values(duration_seconds),
+            log_count = log_count + values(log_count),
+            modified = values(modified)
+        """.format(", ".join(["(%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)"] * len(values))),
+        tuple(v for row in values for v in row),
+    )
+    # A log moved to another task / project leaves an empty row behind.
+    frappe.db.sql(
+        "delete from `tabKiosk Daily Time Summary` where name in %(names)s and log_count <= 0",
+        {"names": tuple(row[0] for row in values)},
+    )
+
+    update_rolled_up_hours(
+        tasks={d[2] for d in deltas},
+        projects={d[3] for d in deltas if d[3]},
+    )
+
+
+def update_rolled_up_hours(tasks: set[str], projects: set[str]) -> None:
+    """Derive Task / Project kiosk hours from the summary table (indexed on task and project)."""
+    if tasks:
+        frappe.db.sql(
+            """
+            update `tabTask` t
+            set t.probuild_kiosk_hours = (
+                select coalesce(sum(s.duration_seconds), 0) / 3600
+                from `tabKiosk Daily Time Summary` s
+                where s.task = t.name
+            )
+            where t.name in %(tasks)s
+            """,
+            {"tasks": tuple(tasks)},
+        )
+    if projects:
+        frappe.db.sql(
+            """
+            update `tabProject` p
+            set p.probuild_kiosk_hours = (
+                select coalesce(sum(s.duration_seconds), 0) / 3600
+                from `tabKiosk Daily Time Summary` s
+                where s.project = p.name
+            )
+            where p.name in %(projects)s
+            """,
+            {"projects": tuple(projects)},
+        )
+
+
+def rebuild_kiosk_time_summary() -> None:
+    """Recompute the whole summary from Kiosk Time Log (patches / repair only)."""
+    frappe.db.sql("delete from `tabKiosk Daily Time Summary`")
+    frappe.db.sql(
+        """
+        insert into `tabKiosk Daily Time Summary`
+            (name, creation, modified, modified_by, owner, summary_date, worker, task, project, duration_seconds, log_count)
+        select
+            left(md5(concat(date(kt.started_at), '|', kt.worker, '|', kt.task, '|', coalesce(kt.project, ''))), 20),
+            %(now)s, %(now)s, %(user)s, %(user)s,
+            date(kt.started_at), kt.worker, kt.task, max(kt.project),
+            sum(coalesce(kt.duration_seconds, 0)), count(*)
+        from `tabKiosk Time Log` kt
+        where kt.status = 'Stopped'
+        group by date(kt.started_at), kt.worker, kt.task, coalesce(kt.project, '')
+        """,
+        {"now": now_datetime(), "user": frappe.session.user},
+    )
+    frappe.db.sql(
+        """
+        update `tabTask` t
+        left join (
+            select task, sum(duration_seconds) as seconds
+            from `tabKiosk Daily Time Summary`
+            group by task
+        ) s on s.task = t.name
+        set t.probuild_kiosk_hours = coalesce(s.seconds, 0) / 3600
+        """
+    )
+    frappe.db.sql(
+        """
+        update `tabProject` p
+        left join (
+            select project, sum(duration_seconds) as seconds
+            from `tabKiosk Daily Time Summary`
+            group by project
+        ) s on s.project = p.name
+        set p.probuild_kiosk_hours = coalesce(s.seconds, 0) / 3600
+        """
+    )
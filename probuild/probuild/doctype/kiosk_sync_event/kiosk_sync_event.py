@@ -0,0 +1,9 @@
+from __future__ import annotations
+
+from frappe.model.document import Document
+
+
+class KioskSyncEvent(Document):
+    pass
+
+
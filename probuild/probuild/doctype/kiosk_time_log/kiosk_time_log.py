@@ -4,15 +4,49 @@ from datetime import datetime
 
 import frappe
 from frappe.model.document import Document
+from frappe.utils import getdate
+
+from probuild.probuild.doctype.kiosk_daily_time_summary.kiosk_daily_time_summary import apply_summary_deltas
 
 
 class KioskTimeLog(Document):
     def validate(self):
+        # Claim (or release) the worker's running-timer slot; see running_worker's unique index.
+        self.running_worker = self.worker if self.status == "Running" else None
+
         if self.started_at and self.stopped_at:
             started = _to_dt(self.started_at)
             stopped = _to_dt(self.stopped_at)
             self.duration_seconds = max(0, int((stopped - started).total_seconds()))
 
+    def on_update(self):
+        # Keep Kiosk Daily Time Summary in step: move this log's contribution from its
+        # previous state (if it was already counted) to its current one.
+        before = self.get_doc_before_save()
+        old = summary_contribution(before) if before else None
+        new = summary_contribution(self)
+        if old == new:
+            return
+
+        deltas = []
+        if old:
+            deltas.append((*old[:4], -old[4], -1))
+        if new:
+            deltas.append((*new, 1))
+        apply_summary_deltas(deltas)
+
+    def on_trash(self):
+        old = summary_contribution(self)
+        if old:
+            apply_summary_deltas([(*old[:4], -old[4], -1)])
+
+
+def summary_contribution(log) -> tuple | None:
+    """(summary_date, worker, task, project, seconds) this log adds to the daily summary."""
+    if log.status != "Stopped" or not log.started_at:
+        return None
+    return (getdate(log.started_at), log.worker, log.task, log.project, int(log.duration_seconds or 0))
+
 
 def _to_dt(value) -> datetime:
     if isinstance(value, datetime):
@@ -1,7 +1,47 @@
+from __future__ import annotations
+
+import hashlib
+import hmac
+import secrets
+
+import frappe
 from frappe.model.document import Document
+from frappe.utils import now_datetime
+
+PIN_HASH_ITERATIONS = 100_000
 
 
 class KioskWorker(Document):
-    pass
+    def validate(self):
+        # The Password field holds a mask unless the PIN was just (re)entered.
+        if self.pin and not self.is_dummy_password(self.pin):
+            self.pin_hash = hash_pin(self.pin)
+
+    def on_update(self):
+        if not self.enabled or self.has_value_changed("pin_hash"):
+            revoke_kiosk_sessions(self.name)
+            # Offline kiosks replay events long after their token's Redis entry expired, so
+            # they check this instead (see api.kiosk._verify_offline_session).
+            self.db_set("sessions_revoked_on", now_datetime(), update_modified=False)
+
+    def on_trash(self):
+        revoke_kiosk_sessions(self.name)
+
+
+def hash_pin(pin: str) -> str:
+    salt = secrets.token_hex(16)
+    digest = hashlib.pbkdf2_hmac("sha256", pin.encode(), salt.encode(), PIN_HASH_ITERATIONS).hex()
+    return f"pbkdf2_sha256${PIN_HASH_ITERATIONS}${salt}${digest}"
+
+
+def check_pin(pin: str, pin_hash: str) -> bool:
+    try:
+        _algorithm, iterations, salt, digest = pin_hash.split("$")
+    except ValueError:
+        return False
+    candidate = hashlib.pbkdf2_hmac("sha256", (pin or "").encode(), salt.encode(), int(iterations)).hex()
+    return hmac.compare_digest(candidate.encode(), digest.encode())
 
 
+def revoke_kiosk_sessions(worker: str) -> None:
+    frappe.cache.delete_keys(f"probuild:kiosk_session:{worker}:")
@@ -0,0 +1,94 @@
+from __future__ import annotations
+
+from typing import Any
+
+import frappe
+from frappe.model.document import Document
+from frappe.utils import flt
+
+PLAN_CACHE_KEY = "probuild:task_template_plan"
+
+
+class TaskTemplate(Document):
+    def validate(self):
+        # Raises on duplicate/unknown keys or a dependency cycle; the compiled plan is only
+        # ever built from a template that passed this check.
+        compile_template(self)
+
+    def on_update(self):
+        invalidate_template_plan(self.name)
+
+    def on_trash(self):
+        invalidate_template_plan(self.name)
+
+    def after_rename(self, old_name, new_name, merge=False):
+        invalidate_template_plan(old_name)
+
+
+def get_template_plan(template: str) -> dict[str, Any]:
+    """
+    Compiled plan for a Task Template: {"create_dispatches", "steps"} with steps in
+    dependency order, each {"key", "subject", "team", "hours", "depends_on": [keys]}.
+
+    Cached in Redis until the template changes, so approvals never re-parse or re-check it.
+    """
+    plan = frappe.cache.hget(PLAN_CACHE_KEY, template)
+    if plan is None:
+        doc = frappe.get_cached_doc("Task Template", template)
+        if not doc.enabled:
+            frappe.throw(f"Task Template {template} is disabled.")
+        plan = {"create_dispatches": bool(doc.create_dispatches), "steps": compile_template(doc)}
+        frappe.cache.hset(PLAN_CACHE_KEY, template, plan)
+    return plan
+
+
+def invalidate_template_plan(template: str) -> None:
+    frappe.cache.hdel(PLAN_CACHE_KEY, template)
+
+
+def compile_template(doc: TaskTemplate) -> list[dict[str, Any]]:
+    """Validate the steps as a DAG and return them topologically sorted (stable by row order)."""
+    steps: dict[str, dict[str, Any]] = {}
+    for row in doc.steps:
+        key = (row.step_key or "").strip()
+        if key in steps:
+            frappe.throw(f"Row {row.idx}: step key {key!r} is used more than once.")
+        steps[key] = {
+            "key": key,
+            "subject": row.subject,
+            "team": row.team or None,
+            "hours": flt(row.expected_hours),
+            "depends_on": list(dict.fromkeys(k.strip() for k in (row.depends_on or "").split(",") if k.strip())),
+            "idx": row.idx,
+        }
+
+    for step in steps.values():
+        for dep in step["depends_on"]:
+            if dep == step["key"]:
+                frappe.throw(f"Row {step['idx']}: step {dep!r} cannot depend on itself.")
+            if dep not in steps:
+                frappe.throw(f"Row {step['idx']}: unknown step key {dep!r} in Depends On.")
+
+    # Kahn's algorithm, always taking the earliest row that is ready.
+    remaining = {key: len(step["depends_on"]) for key, step in steps.items()}
+    dependents: dict[str, list[str]] = {key: [] for key in steps}
+    for step in steps.values():
+        for dep in step["depends_on"]:
+            dependents[dep].append(step["key"])
+
+    ready = sorted((key for key, n in remaining.items() if not n), key=lambda k: steps[k]["idx"])
+    ordered = []
+    while ready:
+        key = ready.pop(0)
+        ordered.append(key)
+        for succ in dependents[key]:
+            remaining[succ] -= 1
+            if not remaining[succ]:
+                ready.append(succ)
+                ready.sort(key=lambda k: steps[k]["idx"])
+
+    if len(ordered) != len(steps):
+        cycle = ", ".join(key for key in steps if key not in ordered)
+        frappe.throw(f"Steps form a dependency cycle: {cycle}")
+
+    return [{k: v for k, v in steps[key].items() if k != "idx"} for key in ordered]
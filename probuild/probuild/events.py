@@ -1,8 +1,13 @@
 from __future__ import annotations
 
+from functools import partial
+
 import frappe
 from frappe.utils import cint
 
+from probuild.probuild.api.kiosk import invalidate_open_tasks_snapshot
+from probuild.probuild.api.wallboard import invalidate_board_snapshot
+from probuild.probuild.critical_path import invalidate_critical_path
 from probuild.probuild.reference import (
     build_milestone_invoice_ref,
     next_base_ref,
@@ -26,8 +31,9 @@ def opportunity_autoname(doc, method=None):
     if doc.name and not doc.name.startswith("new-opportunity"):
         return  # Already named
     
-    # Opportunity always gets its own unique base ref (the job/deal number)
-    base = next_base_ref()
+    # Opportunity always gets its own unique base ref (the job/deal number). Bulk imports
+    # pass one reserved in advance (api.imports) through doc.flags.
+    base = doc.flags.get("probuild_base_ref") or next_base_ref()
     doc.probuild_base_ref = base
     doc.name = f"{base}-P"
 
@@ -50,7 +56,7 @@ def quotation_autoname(doc, method=None):
         return
 
     doc.probuild_base_ref = base
-    doc.probuild_quote_ref = next_quote_ref(base)
+    doc.probuild_quote_ref = doc.flags.get("probuild_quote_ref") or next_quote_ref(base)
     doc.name = doc.probuild_quote_ref
 
 
@@ -127,3 +133,56 @@ def sales_invoice_autoname(doc, method=None):
         else:
             doc.probuild_display_ref = f"{base}-CR-{cint(doc.probuild_credit_no)}"
         doc.name = doc.probuild_display_ref
+
+
+# ============================================================
+# SOIL PRE-FETCH - Resolve site soil in the background on save
+# ============================================================
+
+
+def enqueue_soil_lookup(doc, method=None):
+    """Queue a soil lookup when an Opportunity/Prospect gets new site coordinates."""
+    if not (doc.get("probuild_site_latitude") and doc.get("probuild_site_longitude")):
+        return
+
+    moved = doc.has_value_changed("probuild_site_latitude") or doc.has_value_changed("probuild_site_longitude")
+    if doc.get("probuild_soil_checked_on") and not moved:
+        return
+
+    frappe.enqueue(
+        "probuild.probuild.api.soil.store_soil_data",
+        queue="short",
+        job_id=f"probuild_soil::{doc.doctype}::{doc.name}",
+        deduplicate=True,
+        enqueue_after_commit=True,
+        doctype=doc.doctype,
+        name=doc.name,
+    )
+
+
+# ============================================================
+# TASK / DISPATCH CHANGES - Derived fields and shared shop-floor snapshots
+# ============================================================
+
+
+def task_validate(doc, method=None):
+    """Keep the stored effective due date (planned date, else expected end) in sync."""
+    doc.probuild_due_date = doc.get("probuild_planned_date") or doc.get("exp_end_date")
+
+
+def task_on_change(doc, method=None):
+    """
+    Invalidate cached views built from Task (kiosk open tasks, board, the project's critical
+    path) once the change commits.
+    """
+    frappe.db.after_commit.add(invalidate_open_tasks_snapshot)
+    frappe.db.after_commit.add(invalidate_board_snapshot)
+
+    before = doc.get_doc_before_save() if method != "on_trash" else None
+    projects = {doc.get("project"), before.get("project") if before else None}
+    frappe.db.after_commit.add(partial(invalidate_critical_path, *projects))
+
+
+def dispatch_on_change(doc, method=None):
+    """Invalidate the production board snapshot once a Dispatch Deliverable change commits."""
+    frappe.db.after_commit.add(invalidate_board_snapshot)
@@ -0,0 +1,237 @@
+from __future__ import annotations
+
+import hashlib
+from typing import Any
+
+import frappe
+from frappe.realtime import get_doctype_room
+from frappe.utils import flt, now_datetime
+
+# Low Stock Alert maintenance.
+#
+# Instead of joining every Bin to Item Reorder on each report run, stock movements queue the
+# (item, warehouse) pairs they touch for the current transaction, and just before it commits
+# those pairs (only) are checked against the item's reorder levels:
+#
+#   - below the reorder level: the pair's alert is opened (or refreshed, keeping raised_on);
+#   - at or above it (or no level any more): an open alert is resolved.
+#
+# ERPNext writes Bin quantities with db.set_value (no Bin doc events), so Stock Ledger Entry
+# submission is the reliable signal; the check runs before commit because the Bin is only
+# updated after the entry's own on_submit. Reorder levels are cached per item in a Redis hash
+# and dropped (and the item's bins rechecked) whenever the Item is saved.
+#
+# New shortfalls are pushed on LOW_STOCK_EVENT after commit, to the Low Stock Alert doctype
+# room only (joined via doctype_subscribe, which the socket server allows for readers).
+
+LOW_STOCK_EVENT = "probuild-low-stock"
+REORDER_CACHE_KEY = "probuild:reorder_levels"
+PENDING_FLAG = "probuild_low_stock_pending"
+SAVEPOINT = "probuild_low_stock"
+ALERT_FIELDS = ["item_code", "warehouse", "status", "actual_qty", "reorder_level", "reorder_qty", "shortfall"]
+
+
+def alert_name(item_code: str, warehouse: str) -> str:
+    # Deterministic, so checks can upsert on the primary key.
+    return hashlib.md5(f"{item_code}|{warehouse}".encode()).hexdigest()[:20]
+
+
+def queue_bin_check(doc, method=None):
+    """doc_events handler (Stock Ledger Entry on_submit, Bin on_update)."""
+    queue_low_stock_check([(doc.item_code, doc.warehouse)])
+
+
+def on_item_update(doc, method=None):
+    """doc_events handler: reorder levels may have changed, recheck every bin of the item."""
+    frappe.cache.hdel(REORDER_CACHE_KEY, doc.name)
+    warehouses = frappe.get_all("Bin", filters={"item_code": doc.name}, pluck="warehouse")
+    queue_low_stock_check([(doc.name, warehouse) for warehouse in warehouses])
+
+
+def queue_low_stock_check(pairs: list[tuple[str, str]]) -> None:
+    """Check these (item, warehouse) pairs once, just before the current transaction commits."""
+    pairs = [(item, warehouse) for item, warehouse in pairs if item and warehouse]
+    if not pairs:
+        return
+    pending = frappe.flags.get(PENDING_FLAG)
+    if pending is None:
+        pending = frappe.flags[PENDING_FLAG] = set()
+        frappe.db.before_commit.add(_flush_pending)
+        frappe.db.after_rollback.add(_discard_pending)
+    pending.update(pairs)
+
+
+def _flush_pending() -> None:
+    pairs = frappe.flags.pop(PENDING_FLAG, None)
+    if not pairs:
+        return
+    frappe.db.savepoint(SAVEPOINT)
+    try:
+        check_low_stock(pairs)
+    except (frappe.QueryDeadlockError, frappe.QueryTimeoutError):
+        # The database may already have rolled the whole transaction back: committing now
+        # would silently drop the stock posting, so fail it instead.
+        raise
+    except Exception:
+        # Alerting must never block a stock posting; the next movement (or a rebuild) catches up.
+        frappe.db.rollback(save_point=SAVEPOINT)
+        frappe.log_error(frappe.get_traceback(), "Probuild Low Stock Check")
+
+
+def _discard_pending() -> None:
+    frappe.flags.pop(PENDING_FLAG, None)
+
+
+def check_low_stock(pairs: set[tuple[str, str]] | list[tuple[str, str]]) -> None:
+    """Open, refresh or resolve the alerts for these (item, warehouse) pairs."""
+    pairs = set(pairs)
+    items = {item for item, _warehouse in pairs}
+    levels = get_reorder_levels(items)
+    bins = frappe.get_all(
+        "Bin",
+        filters={"item_code": ["in", list(items)], "warehouse": ["in", list({w for _i, w in pairs})]},
+        fields=["item_code", "warehouse", "actual_qty"],
+    )
+    qty = {(b.item_code, b.warehouse): flt(b.actual_qty) for b in bins}
+
+    short, recovered = [], []
+    for item, warehouse in pairs:
+        alert = _evaluate(item, warehouse, qty.get((item, warehouse), 0.0), levels.get(item, {}))
+        if alert:
+            short.append(alert)
+        else:
+            recovered.append(alert_name(item, warehouse))
+
+    if recovered:
+        frappe.db.sql(
+            """
+            update `tabLow Stock Alert`
+            set status = 'Resolved', resolved_on = %(now)s, modified = %(now)s
+            where name in %(names)s and status = 'Open'
+            """,
+            {"names": tuple(sorted(recovered)), "now": now_datetime()},
+        )
+    if short:
+        _open_alerts(short)
+
+
+def get_reorder_levels(items: set[str] | list[str]) -> dict[str, dict[str, list[float]]]:
+    """
+    {item: {warehouse: [reorder level, reorder qty]}} from Item Reorder, cached per item. A row
+    without a warehouse is stored under "" and applies to warehouses without their own row.
+    """
+    out: dict[str, dict[str, list[float]]] = {}
+    missing = []
+    for item in items:
+        cached = frappe.cache.hget(REORDER_CACHE_KEY, item)
+        if cached is None:
+            missing.append(item)
+        else:
+            out[item] = cached
+
+    if missing:
+        loaded = _load_reorder_levels(missing)
+        for item in missing:
+            out[item] = loaded.get(item, {})
+            frappe.cache.hset(REORDER_CACHE_KEY, item, out[item])
+    return out
+
+
+def rebuild_low_stock_alerts() -> None:
+    """Recompute every alert from Bin and Item Reorder (patches / repair only)."""
+    frappe.db.sql("delete from `tabLow Stock Alert`")
+    frappe.cache.delete_value(REORDER_CACHE_KEY)
+    levels = _load_reorder_levels()
+    if not levels:
+        return
+
+    bins = frappe.get_all(
+        "Bin", filters={"item_code": ["in", list(levels)]}, fields=["item_code", "warehouse", "actual_qty"]
+    )
+    now = now_datetime()
+    user = frappe.session.user
+    rows = []
+    for b in bins:
+        alert = _evaluate(b.item_code, b.warehouse, flt(b.actual_qty), levels[b.item_code])
+        if alert:
+            rows.append((alert["name"], now, now, user, user, *(alert[f] for f in ALERT_FIELDS), now))
+
+    frappe.db.bulk_insert(
+        "Low Stock Alert",
+        ["name", "creation", "modified", "modified_by", "owner", *ALERT_FIELDS, "raised_on"],
+        rows,
+    )
+
+
+def _evaluate(
+    item_code: str, warehouse: str, actual_qty: float, item_levels: dict[str, list[float]]
+) -> dict[str, Any] | None:
+    """The open alert for this bin, or None if it is not below its reorder level."""
+    level, reorder_qty = item_levels.get(warehouse) or item_levels.get("") or (0.0, 0.0)
+    if level <= 0 or actual_qty >= level:
+        return None
+    return {
+        "name": alert_name(item_code, warehouse),
+        "item_code": item_code,
+        "warehouse": warehouse,
+        "status": "Open",
+        "actual_qty": actual_qty,
+        "reorder_level": level,
+        "reorder_qty": reorder_qty,
+        "shortfall": level - actual_qty,
+    }
+
+
+def _load_reorder_levels(items: list[str] | None = None) -> dict[str, dict[str, list[float]]]:
+    filters = {"parenttype": "Item", "warehouse_reorder_level": [">", 0]}
+    if items is not None:
+        filters["parent"] = ["in", items]
+    out: dict[str, dict[str, list[float]]] = {}
+    for r in frappe.get_all(
+        "Item Reorder",
+        filters=filters,
+        fields=["parent", "warehouse", "warehouse_reorder_level", "warehouse_reorder_qty"],
+        order_by="idx asc",
+    ):
+        # First row wins if an item lists the same warehouse twice.
+        out.setdefault(r.parent, {}).setdefault(
+            r.warehouse or "", [flt(r.warehouse_reorder_level), flt(r.warehouse_reorder_qty)]
+        )
+    return out
+
+
+def _open_alerts(alerts: list[dict[str, Any]]) -> None:
+    # Upsert in primary key order, so concurrent postings take the row locks in the same order
+    # and cannot deadlock on each other.
+    alerts = sorted(alerts, key=lambda a: a["name"])
+    names = [a["name"] for a in alerts]
+    already_open = set(
+        frappe.get_all("Low Stock Alert", filters={"name": ["in", names], "status": "Open"}, pluck="name")
+    )
+
+    now = now_datetime()
+    user = frappe.session.user
+    values = [(a["name"], now, now, user, user, *(a[f] for f in ALERT_FIELDS), now) for a in alerts]
+    # Assignments run left to right: raised_on must be decided before status is overwritten.
+    frappe.db.sql(
+        """
+        insert into `tabLow Stock Alert`
+            (name, creation, modified, modified_by, owner,
+             item_code, warehouse, status, actual_qty, reorder_level, reorder_qty, shortfall, raised_on)
+        values {}
+        on duplicate key update
+            raised_on = if(status = 'Open', raised_on, values(raised_on)),
+            status = 'Open',
+            resolved_on = null,
+            actual_qty = values(actual_qty),
+            reorder_level = values(reorder_level),
+            reorder_qty = values(reorder_qty),
+            shortfall = values(shortfall),
+            modified = values(modified)
+        """.format(", ".join(["(%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)"] * len(values))),
+        tuple(v for row in values for v in row),
+    )
+
+    raised = [{f: a[f] for f in ("name", *ALERT_FIELDS)} for a in alerts if a["name"] not in already_open]
+    if raised:
+        frappe.publish_realtime(LOW_STOCK_EVENT, {"alerts": raised}, room=get_doctype_room("Low Stock Alert"), after_commit=True)
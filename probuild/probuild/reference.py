@@ -3,10 +3,51 @@ from __future__ import annotations
 from dataclasses import dataclass
 
 import frappe
-from frappe.model.naming import make_autoname
+from frappe.model.naming import make_autoname, parse_naming_series
 from frappe.utils import now_datetime
 
 
+def reserve_series_block(prefix: str, count: int) -> int:
+    """
+    Atomically advance the `tabSeries` counter for `prefix` by `count` and return the first
+    number of the reserved block. The upsert row-locks the series until commit, so concurrent
+    make_autoname calls and other reservations queue behind it instead of colliding.
+    """
+    frappe.db.sql(
+        """
+        insert into `tabSeries` (name, current) values (%(prefix)s, %(count)s)
+        on duplicate key update current = current + %(count)s
+        """,
+        {"prefix": prefix, "count": count},
+    )
+    last = frappe.db.sql("select current from `tabSeries` where name = %s", (prefix,))[0][0]
+    return int(last) - count + 1
+
+
+def raise_series_floor(prefix: str, value: int) -> None:
+    """Make sure the `tabSeries` counter for `prefix` is at least `value` (e.g. after importing
+    records that carry their own, historical numbers from that series)."""
+    frappe.db.sql(
+        """
+        insert into `tabSeries` (name, current) values (%(prefix)s, %(value)s)
+        on duplicate key update current = greatest(current, values(current))
+        """,
+        {"prefix": prefix, "value": value},
+    )
+
+
+def reserve_names(doctype: str, count: int) -> list[str]:
+    """Reserve `count` names for a doctype whose autoname is a naming series ending in .###."""
+    autoname = frappe.get_meta(doctype).autoname or ""
+    series, _dot, hashes = autoname.rpartition(".")
+    if not series or not hashes or set(hashes) != {"#"}:
+        frappe.throw(f"Cannot reserve names for {doctype}: autoname {autoname!r} is not a numbered series.")
+
+    prefix = parse_naming_series(series, doctype=doctype)
+    start = reserve_series_block(prefix, count)
+    return [f"{prefix}{n:0{len(hashes)}d}" for n in range(start, start + count)]
+
+
 def current_mmyy() -> str:
     dt = now_datetime()
     return f"{dt.month:02d}{dt.year % 100:02d}"
@@ -18,17 +59,125 @@ def next_base_ref() -> str:
     return make_autoname(f"{mmyy}-.###")
 
 
+def reserve_base_refs(count: int, mmyy: str | None = None) -> list[str]:
+    """
+    Reserve a contiguous block of base refs from the same series next_base_ref uses (one
+    series update instead of one per record). Reserved within the caller's transaction, so
+    a rolled-back import leaves no gap. `mmyy` defaults to the current month.
+    """
+    prefix = f"{mmyy or current_mmyy()}-"
+    start = reserve_series_block(prefix, count)
+    return [f"{prefix}{n:03d}" for n in range(start, start + count)]
+
+
 def next_quote_ref(base_ref: str) -> str:
     # Per-lead quote counter: 0125-001-Q1, Q2, ...
     return make_autoname(f"{base_ref}-Q.#")
 
 
+def reserve_quote_refs(base_ref: str, count: int) -> list[str]:
+    """Block version of next_quote_ref."""
+    start = reserve_series_block(f"{base_ref}-Q", count)
+    return [f"{base_ref}-Q{n}" for n in range(start, start + count)]
+
+
 def next_variation_ref(base_ref: str) -> str:
-    return make_autoname(f"{base_ref}-VAR-.#")
+    return f"{base_ref}-VAR-{next_ref_counter(base_ref, 'Variation')}"
 
 
 def next_credit_ref(base_ref: str) -> str:
-    return make_autoname(f"{base_ref}-CR-.#")
+    return f"{base_ref}-CR-{next_ref_counter(base_ref, 'Credit')}"
+
+
+# counter_type -> (legacy tabSeries prefix, Sales Invoice field holding the issued number)
+REF_COUNTERS = {
+    "Milestone": (None, "probuild_milestone_index"),
+    "Variation": ("{base_ref}-VAR-", "probuild_variation_no"),
+    "Credit": ("{base_ref}-CR-", "probuild_credit_no"),
+}
+
+
+def next_ref_counter(base_ref: str, counter_type: str) -> int:
+    """
+    Issue the next milestone / variation / credit number for a base ref.
+
+    One Probuild Ref Counter row per (base ref, counter) is incremented with a single upsert,
+    which row-locks it until commit: concurrent invoices for the same job queue on that row
+    and always get distinct numbers. A counter is seeded from numbers issued before it
+    existed.
+    """
+    return reserve_ref_counter_block(base_ref, counter_type, 1)
+
+
+def reserve_ref_counter_block(base_ref: str, counter_type: str, count: int) -> int:
+    """Reserve `count` consecutive numbers from a ref counter; returns the first."""
+    name = f"{base_ref}-{counter_type}"
+    seed = 0 if frappe.db.exists("Probuild Ref Counter", name) else _ref_counter_seed(base_ref, counter_type)
+    now = now_datetime()
+    user = frappe.session.user
+    frappe.db.sql(
+        """
+        insert into `tabProbuild Ref Counter`
+            (name, creation, modified, owner, modified_by, base_ref, counter_type, current)
+        values (%(name)s, %(now)s, %(now)s, %(user)s, %(user)s, %(base_ref)s, %(counter_type)s, %(last)s)
+        on duplicate key update current = current + %(count)s, modified = values(modified)
+        """,
+        {
+            "name": name,
+            "now": now,
+            "user": user,
+            "base_ref": base_ref,
+            "counter_type": counter_type,
+            "last": seed + count,
+            "count": count,
+        },
+    )
+    last = frappe.db.sql("select current from `tabProbuild Ref Counter` where name = %s", (name,))[0][0]
+    return int(last) - count + 1
+
+
+def raise_ref_counter_floor(base_ref: str, counter_type: str, value: int) -> None:
+    """Make sure a ref counter is at least `value`, so it never reissues an imported number."""
+    name = f"{base_ref}-{counter_type}"
+    seed = 0 if frappe.db.exists("Probuild Ref Counter", name) else _ref_counter_seed(base_ref, counter_type)
+    now = now_datetime()
+    user = frappe.session.user
+    frappe.db.sql(
+        """
+        insert into `tabProbuild Ref Counter`
+            (name, creation, modified, owner, modified_by, base_ref, counter_type, current)
+        values (%(name)s, %(now)s, %(now)s, %(user)s, %(user)s, %(base_ref)s, %(counter_type)s, %(value)s)
+        on duplicate key update current = greatest(current, values(current)), modified = values(modified)
+        """,
+        {
+            "name": name,
+            "now": now,
+            "user": user,
+            "base_ref": base_ref,
+            "counter_type": counter_type,
+            "value": max(seed, value),
+        },
+    )
+
+
+def _ref_counter_seed(base_ref: str, counter_type: str) -> int:
+    series, fieldname = REF_COUNTERS[counter_type]
+    issued = frappe.db.sql(
+        f"""
+        select max(coalesce({fieldname}, 0))
+        from `tabSales Invoice`
+        where probuild_base_ref = %s
+        """,
+        (base_ref,),
+    )[0][0]
+    seed = int(issued or 0)
+    if series:
+        # Numbers issued by the make_autoname series these counters replace.
+        legacy = frappe.db.sql(
+            "select current from `tabSeries` where name = %s", (series.format(base_ref=base_ref),)
+        )
+        seed = max(seed, int(legacy[0][0] or 0) if legacy else 0)
+    return seed
 
 
 @dataclass(frozen=True)
@@ -43,19 +192,10 @@ def build_milestone_invoice_ref(base_ref: str, index: int, total: int) -> Invoic
 
 
 def next_milestone_index(base_ref: str) -> int:
-    # NOTE: we intentionally look at the custom field, not docname, because ERPNext invoice
-    # names remain internal. This keeps numbering human-friendly and stable.
-    max_idx = frappe.db.sql(
-        """
-        select max(coalesce(probuild_milestone_index, 0))
-        from `tabSales Invoice`
-        where probuild_base_ref = %s
-          and probuild_invoice_kind = 'Milestone'
-          and docstatus < 2
-        """,
-        (base_ref,),
-    )[0][0]
-    return int(max_idx or 0) + 1
+    # NOTE: numbering follows the custom field, not docname, because ERPNext invoice names
+    # remain internal. This keeps numbering human-friendly and stable. Cancelled invoices keep
+    # their number (and name), so it is never reissued.
+    return next_ref_counter(base_ref, "Milestone")
 
 
 
@@ -11,20 +11,21 @@ def execute(filters=None):
     from_date = getdate(filters.get("from_date") or (date.today() - timedelta(days=7)))
     to_date = getdate(filters.get("to_date") or date.today())
 
+    # Read the daily roll-up maintained from Kiosk Time Log (indexed on summary_date)
+    # instead of scanning and grouping every raw log.
     rows = frappe.db.sql(
         """
         select
-            kt.worker as worker,
+            s.worker as worker,
             kw.worker_name as worker_name,
-            kt.task as task,
+            s.task as task,
             t.subject as task_subject,
-            sum(coalesce(kt.duration_seconds, 0)) as duration_seconds
-        from `tabKiosk Time Log` kt
-        left join `tabKiosk Worker` kw on kw.name = kt.worker
-        left join `tabTask` t on t.name = kt.task
-        where date(kt.started_at) between %s and %s
-          and kt.status = 'Stopped'
-        group by kt.worker, kt.task
+            sum(s.duration_seconds) as duration_seconds
+        from `tabKiosk Daily Time Summary` s
+        left join `tabKiosk Worker` kw on kw.name = s.worker
+        left join `tabTask` t on t.name = s.task
+        where s.summary_date between %s and %s
+        group by s.worker, s.task
         order by duration_seconds desc
         """,
         (from_date, to_date),
@@ -64,27 +64,19 @@ def _get_capacity_by_weekday(team: str) -> dict[str, float]:
 
 
 def _get_planned_hours(team: str, from_date: date, to_date: date) -> dict[date, tuple[float, int]]:
-    # Prefer explicit planned date; fall back to expected end date for MVP.
-    tasks = frappe.get_all(
+    # Aggregated in SQL on the stored effective due date (planned date, else expected end
+    # date), served by the (probuild_team, probuild_due_date, status) index: cost scales with
+    # the days shown, not with every open task the team has.
+    rows = frappe.get_all(
         "Task",
         filters={
-            "status": ["not in", ["Completed", "Cancelled"]],
             "probuild_team": team,
+            "probuild_due_date": ["between", [from_date, to_date]],
+            "status": ["not in", ["Completed", "Cancelled"]],
             "expected_time": [">", 0],
         },
-        fields=["name", "expected_time", "probuild_planned_date", "exp_end_date"],
+        fields=["probuild_due_date as day", "sum(expected_time) as hours", "count(name) as tasks"],
+        group_by="probuild_due_date",
+        order_by="probuild_due_date asc",
     )
-
-    out: dict[date, tuple[float, int]] = {}
-    for t in tasks:
-        d = getdate(t.get("probuild_planned_date") or t.get("exp_end_date"))
-        if not d:
-            continue
-        if d < from_date or d > to_date:
-            continue
-        hours = float(t.get("expected_time") or 0)
-        prev_hours, prev_count = out.get(d, (0.0, 0))
-        out[d] = (prev_hours + hours, prev_count + 1)
-    return out
-
-
+    return {getdate(r.day): (float(r.hours or 0), int(r.tasks or 0)) for r in rows}
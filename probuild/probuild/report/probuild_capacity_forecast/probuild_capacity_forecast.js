@@ -0,0 +1,57 @@
+/* global frappe */
+
+// Heatmap colours per metric: red where a team is over capacity or carrying backlog,
+// amber when close to full, green with spare capacity.
+function probuild_forecast_colour(metric, value) {
+  if (value === null || value === undefined || value === "") return null;
+  if (metric === "Utilisation") {
+    if (value > 100) return "#f8d7da";
+    if (value >= 85) return "#fff3cd";
+    return "#d4edda";
+  }
+  if (metric === "Variance") return value < 0 ? "#f8d7da" : value > 0 ? "#d4edda" : null;
+  if (metric === "Backlog") return value > 0 ? "#f8d7da" : "#d4edda";
+  return null;
+}
+
+frappe.query_reports["Probuild Capacity Forecast"] = {
+  filters: [
+    {
+      fieldname: "from_date",
+      label: "From Date",
+      fieldtype: "Date",
+      default: frappe.datetime.get_today(),
+      reqd: 1,
+    },
+    {
+      fieldname: "days",
+      label: "Days",
+      fieldtype: "Int",
+      default: 90,
+      reqd: 1,
+    },
+    {
+      fieldname: "metric",
+      label: "Metric",
+      fieldtype: "Select",
+      options: "Utilisation\nVariance\nBacklog\nLoad\nCapacity",
+      default: "Utilisation",
+      reqd: 1,
+    },
+    {
+      fieldname: "team",
+      label: "Team",
+      fieldtype: "Select",
+      options: "\nProduction\nInstallation",
+    },
+  ],
+  formatter(value, row, column, data, default_formatter) {
+    value = default_formatter(value, row, column, data);
+    if (!column.fieldname || !column.fieldname.startsWith("d_")) return value;
+    const colour = probuild_forecast_colour(
+      frappe.query_report.get_filter_value("metric"),
+      data && data[column.fieldname]
+    );
+    return colour ? `<div style="background:${colour}; margin:-4px -8px; padding:4px 8px;">${value}</div>` : value;
+  },
+};
@@ -0,0 +1,54 @@
+from __future__ import annotations
+
+from datetime import date
+
+import numpy as np
+from frappe.utils import getdate
+
+from probuild.probuild.capacity_forecast import DEFAULT_FORECAST_DAYS, build_forecast
+
+METRICS = {
+    "Utilisation": ("utilisation", "Percent"),
+    "Variance": ("variance", "Float"),
+    "Backlog": ("backlog", "Float"),
+    "Load": ("load", "Float"),
+    "Capacity": ("capacity", "Float"),
+}
+
+
+def execute(filters=None):
+    # Heatmap: one row per team, one column per day, cells coloured by the JS formatter.
+    filters = filters or {}
+    metric = filters.get("metric") or "Utilisation"
+    attr, fieldtype = METRICS.get(metric, METRICS["Utilisation"])
+    teams = [filters["team"]] if filters.get("team") else None
+
+    forecast = build_forecast(
+        getdate(filters.get("from_date") or date.today()),
+        int(filters.get("days") or DEFAULT_FORECAST_DAYS),
+        teams,
+    )
+    values = getattr(forecast, attr)
+    if attr == "utilisation":
+        values = values * 100
+
+    columns = [{"fieldname": "team", "label": "Team", "fieldtype": "Data", "width": 120}]
+    columns += [
+        {"fieldname": _day_field(d), "label": d.strftime("%a %d/%m"), "fieldtype": fieldtype, "width": 80}
+        for d in forecast.days
+    ]
+
+    data = []
+    for team, row in zip(forecast.teams, values, strict=True):
+        cells = {_day_field(d): None if np.isnan(v) else round(float(v), 1) for d, v in zip(forecast.days, row, strict=True)}
+        data.append({"team": team, **cells})
+
+    overdue = ", ".join(
+        f"{team}: {hours:.1f} h" for team, hours in zip(forecast.teams, forecast.opening_backlog, strict=True) if hours
+    )
+    message = f"Overdue before {forecast.from_date}: {overdue}" if overdue else None
+    return columns, data, message
+
+
+def _day_field(d: date) -> str:
+    return f"d_{d:%Y%m%d}"
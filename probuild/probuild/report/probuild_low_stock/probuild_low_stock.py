@@ -2,45 +2,41 @@ from __future__ import annotations
 
 import frappe
 
+from probuild.probuild.availability import get_net_availability
+
 
 def execute(filters=None):
     filters = filters or {}
-    warehouse = filters.get("warehouse")
-
-    wh_clause = ""
-    params = []
-    if warehouse:
-        wh_clause = "and b.warehouse = %s"
-        params.append(warehouse)
-
-    rows = frappe.db.sql(
-        f"""
-        select
-            b.item_code,
-            b.warehouse,
-            b.actual_qty,
-            ir.warehouse_reorder_level as reorder_level,
-            ir.warehouse_reorder_qty as reorder_qty
-        from `tabBin` b
-        left join `tabItem Reorder` ir
-            on ir.parent = b.item_code
-            and (ir.warehouse = b.warehouse or ir.warehouse is null)
-        where coalesce(ir.warehouse_reorder_level, 0) > 0
-          and b.actual_qty < ir.warehouse_reorder_level
-          {wh_clause}
-        order by (ir.warehouse_reorder_level - b.actual_qty) desc
-        """,
-        tuple(params),
-        as_dict=True,
+
+    # Open alerts are maintained from stock movements (see probuild.probuild.low_stock), so the
+    # report no longer joins every Bin to Item Reorder.
+    alert_filters = {"status": "Open"}
+    if filters.get("warehouse"):
+        alert_filters["warehouse"] = filters["warehouse"]
+
+    rows = frappe.get_all(
+        "Low Stock Alert",
+        filters=alert_filters,
+        fields=["item_code", "warehouse", "actual_qty", "reorder_level", "reorder_qty", "shortfall", "raised_on"],
+        order_by="shortfall desc",
     )
 
+    # On hand alone is optimistic: also show what unissued Job Material Allocations hold.
+    availability = get_net_availability(list({r.item_code for r in rows}))
+    for r in rows:
+        stock = availability.get((r.item_code, r.warehouse), {})
+        r.reserved_qty = stock.get("reserved_qty", 0.0)
+        r.available_qty = r.actual_qty - r.reserved_qty
+
     columns = [
         {"fieldname": "item_code", "label": "Item", "fieldtype": "Link", "options": "Item", "width": 180},
         {"fieldname": "warehouse", "label": "Warehouse", "fieldtype": "Link", "options": "Warehouse", "width": 180},
         {"fieldname": "actual_qty", "label": "On Hand", "fieldtype": "Float", "width": 110},
+        {"fieldname": "reserved_qty", "label": "Allocated", "fieldtype": "Float", "width": 110},
+        {"fieldname": "available_qty", "label": "Net Available", "fieldtype": "Float", "width": 120},
         {"fieldname": "reorder_level", "label": "Reorder Level", "fieldtype": "Float", "width": 130},
         {"fieldname": "reorder_qty", "label": "Reorder Qty", "fieldtype": "Float", "width": 120},
+        {"fieldname": "shortfall", "label": "Shortfall", "fieldtype": "Float", "width": 110},
+        {"fieldname": "raised_on", "label": "Since", "fieldtype": "Datetime", "width": 160},
     ]
     return columns, rows
-
-
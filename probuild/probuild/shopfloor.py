@@ -0,0 +1,46 @@
+from __future__ import annotations
+
+from typing import Any
+
+import frappe
+from frappe.realtime import get_doctype_room
+
+# Realtime channel for shop-floor screens (/board, /kiosk). Changes to the doctypes below are
+# pushed as compact row diffs to that doctype's room (joined via doctype_subscribe, which the
+# socket server only allows for users who can read the doctype); screens apply them locally
+# and only poll as a heartbeat.
+SHOPFLOOR_EVENT = "probuild-shopfloor"
+
+SHOPFLOOR_FIELDS = {
+    "Task": ["subject", "project", "status", "probuild_team", "probuild_planned_date", "exp_end_date", "probuild_due_date", "expected_time"],
+    "Dispatch Deliverable": ["deliverable_type", "project", "status", "due_date", "dispatch_method", "job_packet"],
+    "Kiosk Time Log": ["worker", "task", "status", "started_at", "stopped_at", "station"],
+}
+
+
+def publish_change(doc, method=None):
+    """doc_events handler: push the changed row (or its removal) to shop-floor screens."""
+    if method == "on_trash":
+        publish_rows(doc.doctype, [{"name": doc.name}], removed=True)
+    else:
+        publish_rows(doc.doctype, [doc])
+
+
+def publish_rows(doctype: str, rows: list[Any], removed: bool = False) -> None:
+    """Publish row diffs after commit, e.g. for bulk SQL updates that bypass doc events."""
+    fields = SHOPFLOOR_FIELDS[doctype]
+    changes = []
+    for row in rows:
+        change = {"name": row.get("name")}
+        if not removed:
+            change.update({f: row.get(f) for f in fields})
+        changes.append(change)
+
+    frappe.publish_realtime(
+        SHOPFLOOR_EVENT,
+        {"doctype": doctype, "op": "remove" if removed else "upsert", "rows": changes},
+        # Explicit room: only readers of the doctype, not every user on the site (and inside a
+        # background job publish_realtime would otherwise target the job's progress room).
+        room=get_doctype_room(doctype),
+        after_commit=True,
+    )
@@ -0,0 +1,144 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import time
+from collections.abc import Callable
+from typing import Any
+
+import frappe
+from frappe.utils import cint, now
+
+# Shared, versioned payloads for screens that many clients poll (kiosks, wallboards).
+#
+# A snapshot is built once, stored in Redis and served to every client until it is
+# invalidated by a document change. Each snapshot carries an ETag (content hash) so clients
+# can revalidate cheaply, and a version number that increases with every rebuild.
+#
+# Invalidation bumps a generation counter (per key and per group). A build is only kept if
+# no invalidation happened while it ran, so a builder that read data from before a commit
+# cannot store its result after that commit's invalidation.
+
+LOCK_SECONDS = 10
+WAIT_FOR_BUILD_SECONDS = 2.0
+
+# Delete the lock only if it still holds our token (it may have expired and been retaken).
+_RELEASE_LOCK = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("del", KEYS[1])
+end
+return 0
+"""
+
+
+def get_snapshot(
+    key: str, build: Callable[[], Any], expires_in_sec: int | None = None, group: str | None = None
+) -> dict[str, Any]:
+    """
+    Return {"version", "etag", "built_at", "data"} for `key`, building it if missing.
+
+    Snapshots that are variants of one view (e.g. per team) can share a `group`, so a single
+    invalidate_snapshot_group call drops all of them.
+    """
+    snapshot = frappe.cache.get_value(key)
+    if snapshot is not None:
+        return snapshot
+
+    # Only one worker rebuilds; the others wait briefly for its result (and build it
+    # themselves, without the lock, if it doesn't arrive in time).
+    lock_key = frappe.cache.make_key(f"{key}:lock")
+    token = frappe.generate_hash(length=16)
+    locked = frappe.cache.set(lock_key, token, nx=True, ex=LOCK_SECONDS)
+    if not locked:
+        deadline = time.monotonic() + WAIT_FOR_BUILD_SECONDS
+        while time.monotonic() < deadline:
+            time.sleep(0.05)
+            snapshot = frappe.cache.get_value(key)
+            if snapshot is not None:
+                return snapshot
+
+    try:
+        generation = _generation(key, group)
+        snapshot = _store_snapshot(key, build(), expires_in_sec, group, generation)
+    finally:
+        if locked:
+            frappe.cache.eval(_RELEASE_LOCK, 1, lock_key, token)
+    return snapshot
+
+
+def refresh_snapshot(
+    key: str, build: Callable[[], Any], expires_in_sec: int | None = None, group: str | None = None
+) -> dict[str, Any]:
+    """
+    Rebuild `key` in place (scheduler warm-up). Readers keep getting the old snapshot until the
+    new one is stored; the version only moves when the content actually changed.
+    """
+    generation = _generation(key, group)
+    data = build()
+    current = frappe.cache.get_value(key)
+    if current is not None and current["etag"] == make_etag(data):
+        return current
+    return _store_snapshot(key, data, expires_in_sec, group, generation)
+
+
+def _store_snapshot(
+    key: str, data: Any, expires_in_sec: int | None, group: str | None, generation: tuple[int, int]
+) -> dict[str, Any]:
+    snapshot = {
+        "version": frappe.cache.incr(frappe.cache.make_key(f"{key}:version")),
+        "etag": make_etag(data),
+        "built_at": now(),
+        "data": data,
+    }
+    frappe.cache.set_value(key, snapshot, expires_in_sec=expires_in_sec)
+    if group:
+        frappe.cache.sadd(f"{group}:snapshots", key)
+    # Invalidated while building: the data may predate the change, so don't keep it (this
+    # caller still gets it). At worst this drops a newer build, which is only a cache miss.
+    if _generation(key, group) != generation:
+        frappe.cache.delete_value(key)
+    return snapshot
+
+
+def _generation(key: str, group: str | None) -> tuple[int, int]:
+    return (
+        cint(frappe.cache.get(frappe.cache.make_key(f"{key}:generation"))),
+        cint(frappe.cache.get(frappe.cache.make_key(f"{group}:generation"))) if group else 0,
+    )
+
+
+def invalidate_snapshot(key: str) -> None:
+    frappe.cache.incr(frappe.cache.make_key(f"{key}:generation"))
+    frappe.cache.delete_value(key)
+
+
+def invalidate_snapshot_group(group: str) -> None:
+    frappe.cache.incr(frappe.cache.make_key(f"{group}:generation"))
+    members_key = f"{group}:snapshots"
+    keys = [k.decode() if isinstance(k, bytes) else k for k in frappe.cache.smembers(members_key)]
+    if not keys:
+        return
+    frappe.cache.delete_value(keys)
+    # Remove only what was read: a snapshot registered meanwhile stays tracked.
+    frappe.cache.srem(members_key, *keys)
+
+
+def make_etag(data: Any) -> str:
+    return hashlib.md5(json.dumps(data, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def is_not_modified(etag: str, client_etag: str | None = None) -> bool:
+    """
+    True when the client already has `etag`.
+
+    `client_etag` is the value a frappe.call client sends back as an argument. Plain HTTP
+    clients can use If-None-Match instead, in which case the response status becomes 304.
+    """
+    if client_etag and client_etag == etag:
+        return True
+
+    header = frappe.get_request_header("If-None-Match") if frappe.request else None
+    if header and etag in {tag.strip().strip('"') for tag in header.split(",")}:
+        frappe.local.response["http_status_code"] = 304
+        return True
+    return False
@@ -0,0 +1,106 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import re
+import time
+from dataclasses import dataclass, field
+
+import frappe
+
+# Rules live in data/soil_classification.json. A site can point `probuild_soil_rules_path`
+# (site_config.json) at its own copy to extend the vocabulary without a deploy.
+DEFAULT_RULES_PATH = os.path.join(os.path.dirname(__file__), "data", "soil_classification.json")
+RULES_CHECK_INTERVAL = 30  # seconds between checks of the rules file for changes
+
+
+@dataclass
+class CompiledRules:
+    source: tuple[str, int]  # (path, mtime_ns) the rules were compiled from
+    signature: str  # digest of the rules' content, independent of the file they came from
+    default: str
+    # (pattern matching any of the rule's keywords, category), in rule order: the first rule
+    # with a keyword anywhere in the name wins, as in the file
+    rules: list[tuple[re.Pattern, str]]
+    memo: dict[str, tuple[str, bool]] = field(default_factory=dict)
+    checked_at: float = 0.0
+
+
+_compiled: CompiledRules | None = None
+
+
+def get_rules_path() -> str:
+    return frappe.conf.get("probuild_soil_rules_path") or DEFAULT_RULES_PATH
+
+
+def classify(soil_type: str) -> tuple[str, bool]:
+    """
+    Map an ASRIS soil name to a Probuild soil category.
+
+    Returns (category, matched). `matched` is False when no rule fired and the rules'
+    default category was used.
+    """
+    rules = _get_rules()
+    key = (soil_type or "").lower()
+    hit = rules.memo.get(key)
+    if hit is not None:
+        return hit
+
+    category = None
+    if key:
+        category = next((category for pattern, category in rules.rules if pattern.search(key)), None)
+    hit = (category, True) if category else (rules.default, False)
+    rules.memo[key] = hit
+    return hit
+
+
+def rules_signature() -> str:
+    """Identify the active rule set, so data derived from its classifications can be invalidated."""
+    return _get_rules().signature
+
+
+def _get_rules() -> CompiledRules:
+    global _compiled
+
+    now = time.monotonic()
+    if _compiled and now - _compiled.checked_at < RULES_CHECK_INTERVAL:
+        return _compiled
+
+    path = get_rules_path()
+    try:
+        source = (path, os.stat(path).st_mtime_ns)
+    except OSError:
+        # A missing site rules file must not break soil lookups: use the shipped rules.
+        if path == DEFAULT_RULES_PATH:
+            raise
+        frappe.log_error(f"Soil rules file not found: {path}", "Probuild Soil Rules")
+        path = DEFAULT_RULES_PATH
+        source = (path, os.stat(path).st_mtime_ns)
+
+    if not (_compiled and _compiled.source == source):
+        _compiled = compile_rules(path, source)
+    _compiled.checked_at = now
+    return _compiled
+
+
+def compile_rules(path: str, source: tuple[str, int] | None = None) -> CompiledRules:
+    with open(path) as f:
+        config = json.load(f)
+
+    default = config.get("default") or "loam"
+    rules = []
+    for rule in config.get("rules") or []:
+        keywords = [k.strip().lower() for k in rule.get("keywords") or [] if k.strip()]
+        if keywords:
+            # One alternation per rule, so a keyword is only ever weighed against other rules
+            # by rule order, never by where or how long its match is.
+            rules.append((re.compile("|".join(re.escape(k) for k in keywords)), rule["category"]))
+
+    content = json.dumps([default, [(pattern.pattern, category) for pattern, category in rules]])
+    return CompiledRules(
+        source=source or (path, os.stat(path).st_mtime_ns),
+        signature=hashlib.md5(content.encode()).hexdigest(),
+        default=default,
+        rules=rules,
+    )
@@ -0,0 +1,229 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import math
+import mmap
+import os
+import struct
+import time
+from dataclasses import dataclass
+
+import frappe
+
+from probuild.probuild import soil_classifier
+
+# Precomputed soil category grid over Western Australia.
+#
+# Each cell is one byte:
+#   0          no local data (fall back to ASRIS / generic region)
+#   1..126     index + 1 into WA_GEOLOGICAL_ZONES (the cell lies wholly inside that zone)
+#   127        the cell straddles a zone edge: use the exact zone scan for the point
+#   128..255   128 + index into SOIL_WARNINGS (category learned from a cached ASRIS lookup)
+#
+# The file is a fixed header followed by rows * cols bytes (row-major, south to north) and is
+# opened with mmap, so every worker on the host shares the same page-cached copy.
+
+WA_BOUNDS = (-35.5, -13.5, 112.5, 129.5)  # lat_min, lat_max, lng_min, lng_max
+DEFAULT_RESOLUTION = 0.01  # degrees (~1.1 km)
+
+ASRIS_CATEGORY_CACHE_KEY = "probuild:soil_asris_categories"
+ASRIS_CATEGORY_TTL = 90 * 24 * 3600  # learned categories older than this are not baked in
+ASRIS_CODE_OFFSET = 128
+BOUNDARY_CODE = 127
+
+_MAGIC = b"PBSOIL02"
+_HEADER = struct.Struct("<8s5d2I16s")
+
+# path -> (mtime_ns, SoilRaster)
+_open_rasters: dict[str, tuple[int, SoilRaster]] = {}
+
+
+@dataclass
+class SoilRaster:
+    lat_min: float
+    lat_max: float
+    lng_min: float
+    lng_max: float
+    resolution: float
+    rows: int
+    cols: int
+    fingerprint: bytes
+    data: mmap.mmap
+
+    def cell(self, lat: float, lng: float) -> int | None:
+        if not (self.lat_min <= lat < self.lat_max and self.lng_min <= lng < self.lng_max):
+            return None
+        row = int((lat - self.lat_min) / self.resolution)
+        col = int((lng - self.lng_min) / self.resolution)
+        if row >= self.rows or col >= self.cols:
+            return None
+        return self.data[_HEADER.size + row * self.cols + col]
+
+
+def get_raster_path() -> str:
+    return frappe.conf.get("probuild_soil_raster_path") or frappe.get_site_path("private", "probuild_soil_raster.bin")
+
+
+def get_resolution() -> float:
+    return float(frappe.conf.get("probuild_soil_raster_resolution") or DEFAULT_RESOLUTION)
+
+
+def zones_fingerprint(zones: list[dict], categories: list[str], rules_signature: str) -> bytes:
+    """
+    Identify the zone/category tables and soil rules a raster was built from, so a code or rules
+    change invalidates it.
+    """
+    payload = json.dumps([zones, categories, rules_signature], sort_keys=True).encode()
+    return hashlib.md5(payload).digest()
+
+
+def lookup_code(lat: float, lng: float, fingerprint: bytes) -> int | None:
+    """Return the raster byte for a point, or None when no usable raster exists."""
+    raster = _get_raster()
+    if not raster or raster.fingerprint != fingerprint:
+        return None
+    return raster.cell(lat, lng)
+
+
+def _get_raster() -> SoilRaster | None:
+    path = get_raster_path()
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+    cached = _open_rasters.get(path)
+    if cached and cached[0] == mtime:
+        return cached[1]
+
+    with open(path, "rb") as f:
+        data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    magic, lat_min, lat_max, lng_min, lng_max, resolution, rows, cols, fingerprint = _HEADER.unpack_from(data)
+    if magic != _MAGIC or len(data) < _HEADER.size + rows * cols:
+        data.close()
+        return None
+
+    raster = SoilRaster(lat_min, lat_max, lng_min, lng_max, resolution, rows, cols, fingerprint, data)
+    if cached:
+        cached[1].data.close()
+    _open_rasters[path] = (mtime, raster)
+    return raster
+
+
+def remember_asris_category(lat: float, lng: float, category: str) -> None:
+    """Record an ASRIS classification so the next raster build can bake it in."""
+    # Keyed by raster cell, since the build applies it to the whole cell: one entry per cell
+    # at most. Expired entries, and those classified under other rules, are pruned on build.
+    frappe.cache.hset(
+        ASRIS_CATEGORY_CACHE_KEY,
+        _cell_key(lat, lng, get_resolution()),
+        (category, int(time.time()), soil_classifier.rules_signature()),
+    )
+
+
+def _cell_key(lat: float, lng: float, resolution: float) -> str:
+    row = math.floor((lat - WA_BOUNDS[0]) / resolution)
+    col = math.floor((lng - WA_BOUNDS[2]) / resolution)
+    return f"{resolution}:{row},{col}"
+
+
+def build_soil_raster(resolution: float | None = None) -> str:
+    """
+    Rasterize WA_GEOLOGICAL_ZONES plus cached ASRIS classifications into the soil grid.
+
+    Run with `bench --site <site> build-soil-raster` (or `bench execute`) after changing zones.
+    """
+    from probuild.probuild.api.soil import SOIL_WARNINGS, WA_GEOLOGICAL_ZONES
+
+    resolution = float(resolution or get_resolution())
+    lat_min, lat_max, lng_min, lng_max = WA_BOUNDS
+    rows = math.ceil(round((lat_max - lat_min) / resolution, 9))
+    cols = math.ceil(round((lng_max - lng_min) / resolution, 9))
+    categories = list(SOIL_WARNINGS)
+    if len(WA_GEOLOGICAL_ZONES) >= BOUNDARY_CODE:
+        frappe.throw(f"The soil raster holds at most {BOUNDARY_CODE - 1} zones.")
+    grid = bytearray(rows * cols)
+    rules_signature = soil_classifier.rules_signature()
+
+    # Cached ASRIS categories go in first; zones are painted over them because the local
+    # zone table takes priority over ASRIS in get_soil_data.
+    expired = []
+    cutoff = time.time() - ASRIS_CATEGORY_TTL
+    for key, value in (frappe.cache.hgetall(ASRIS_CATEGORY_CACHE_KEY) or {}).items():
+        key = frappe.safe_decode(key)
+        category, recorded_at, signature = (
+            value if isinstance(value, (tuple, list)) and len(value) == 3 else (None, 0, None)
+        )
+        if recorded_at < cutoff or signature != rules_signature:
+            expired.append(key)
+            continue
+        key_resolution, _sep, cell = key.partition(":")
+        if category not in categories or float(key_resolution) != resolution:
+            continue
+        row, col = (int(v) for v in cell.split(","))
+        if 0 <= row < rows and 0 <= col < cols:
+            grid[row * cols + col] = ASRIS_CODE_OFFSET + categories.index(category)
+    if expired:
+        frappe.cache.hdel(ASRIS_CATEGORY_CACHE_KEY, *expired)
+
+    # Paint in reverse so the first matching zone wins, matching the linear scan. Every cell a
+    # zone touches is first marked as a boundary, then the cells wholly inside it get the zone,
+    # so a cell is only resolved from the raster when the whole cell has the same answer.
+    for index in reversed(range(len(WA_GEOLOGICAL_ZONES))):
+        zone = WA_GEOLOGICAL_ZONES[index]
+        outer_rows = _cell_span(zone["lat_min"], zone["lat_max"], lat_min, resolution, rows, inner=False)
+        outer_cols = _cell_span(zone["lng_min"], zone["lng_max"], lng_min, resolution, cols, inner=False)
+        _paint(grid, cols, outer_rows, outer_cols, BOUNDARY_CODE)
+        inner_rows = _cell_span(zone["lat_min"], zone["lat_max"], lat_min, resolution, rows, inner=True)
+        inner_cols = _cell_span(zone["lng_min"], zone["lng_max"], lng_min, resolution, cols, inner=True)
+        _paint(grid, cols, inner_rows, inner_cols, index + 1)
+
+    header = _HEADER.pack(
+        _MAGIC,
+        lat_min,
+        lat_max,
+        lng_min,
+        lng_max,
+        resolution,
+        rows,
+        cols,
+        zones_fingerprint(WA_GEOLOGICAL_ZONES, categories, rules_signature),
+    )
+
+    path = get_raster_path()
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(header)
+        f.write(grid)
+    # Atomic swap: workers holding the old mapping keep reading it until they notice the new mtime.
+    os.replace(tmp_path, path)
+    return path
+
+
+def _cell_span(
+    low: float, high: float, origin: float, resolution: float, size: int, inner: bool
+) -> tuple[int, int]:
+    # Cell k covers [origin + k * resolution, origin + (k + 1) * resolution).
+    low = round((low - origin) / resolution, 9)
+    high = round((high - origin) / resolution, 9)
+    if inner:
+        # Cells lying wholly inside [low, high].
+        first, last = math.ceil(low), math.floor(high) - 1
+    else:
+        # Cells with any point in [low, high], widened by one so float error in the cell
+        # lookup can only ever land on a boundary cell.
+        first, last = math.floor(low) - 1, math.floor(high) + 1
+    return max(first, 0), min(last, size - 1)
+
+
+def _paint(grid: bytearray, cols: int, row_span: tuple[int, int], col_span: tuple[int, int], code: int) -> None:
+    (r0, r1), (c0, c1) = row_span, col_span
+    if r0 > r1 or c0 > c1:
+        return
+    fill = bytes([code]) * (c1 - c0 + 1)
+    for row in range(r0, r1 + 1):
+        start = row * cols + c0
+        grid[start : start + len(fill)] = fill
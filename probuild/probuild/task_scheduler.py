@@ -0,0 +1,284 @@
+from __future__ import annotations
+
+import heapq
+from collections import defaultdict
+from dataclasses import dataclass, field
+from datetime import date, timedelta
+from typing import Any
+
+import frappe
+from frappe.utils import flt, getdate
+
+from probuild.probuild.api.kiosk import invalidate_open_tasks_snapshot
+from probuild.probuild.api.wallboard import invalidate_board_snapshot
+from probuild.probuild.capacity_forecast import get_team_weekday_hours
+
+# Capacity-aware list scheduler for open Tasks.
+#
+# Every open Task without a planned date is given one, over the whole Task dependency graph
+# (Task.depends_on) at once:
+#
+#   - a task can start the day after all of its open dependencies finish;
+#   - it consumes its expected_time from its team's remaining daily hours (Capacity Profile
+#     weekday hours minus work already planned that day), spilling over to following days
+#     when it doesn't fit, and is planned on the day it finishes;
+#   - teams without a Capacity Profile are not capacity-limited;
+#   - among tasks ready at the same time, the priority queue takes higher Task.priority first,
+#     then the one with the longest chain of work after it (so long chains start early), then
+#     the earliest possible start.
+#
+# Tasks that already have a planned date keep it and count against capacity.
+
+PRIORITY_RANK = {"Urgent": 0, "High": 1, "Medium": 2, "Low": 3}
+HORIZON_DAYS = 730
+
+
+@dataclass
+class _Task:
+    name: str
+    team: str | None
+    hours: float
+    priority: int
+    depends_on: list[str] = field(default_factory=list)
+    successors: list[str] = field(default_factory=list)
+
+
+@dataclass
+class ScheduleResult:
+    start_date: date
+    dry_run: bool
+    scheduled: dict[str, date] = field(default_factory=dict)
+    unscheduled: dict[str, str] = field(default_factory=dict)
+
+    def as_dict(self) -> dict[str, Any]:
+        return {
+            "start_date": str(self.start_date),
+            "dry_run": self.dry_run,
+            "scheduled": [{"task": name, "planned_date": str(day)} for name, day in self.scheduled.items()],
+            "unscheduled": [{"task": name, "reason": reason} for name, reason in self.unscheduled.items()],
+        }
+
+
+def schedule_tasks(
+    start_date: date | str | None = None, reschedule: bool = False, dry_run: bool = False
+) -> ScheduleResult:
+    """
+    Plan every unscheduled open Task from `start_date` (default today).
+
+    `reschedule` also re-plans Open tasks that already have a planned date (Working tasks keep
+    theirs). With `dry_run` nothing is written: the result is a what-if plan.
+    """
+    start_date = getdate(start_date or date.today())
+    result = ScheduleResult(start_date=start_date, dry_run=dry_run)
+
+    tasks, fixed = _load_tasks(reschedule)
+    if not tasks:
+        return result
+
+    capacity = _Capacity(start_date, get_team_weekday_hours())
+    for team, day, hours in _planned_load(fixed, start_date):
+        capacity.reserve(team, day, hours)
+
+    # Dependencies on tasks outside the plan: open ones with a date constrain the start,
+    # completed/cancelled ones (or undated ones we are not planning) don't.
+    fixed_dates = {name: day for name, (_team, day, _hours) in fixed.items()}
+    earliest: dict[str, date] = {}
+    indegree: dict[str, int] = {}
+    for task in tasks.values():
+        earliest[task.name] = start_date
+        indegree[task.name] = 0
+        for dep in task.depends_on:
+            if dep in tasks:
+                indegree[task.name] += 1
+                tasks[dep].successors.append(task.name)
+            elif dep in fixed_dates:
+                earliest[task.name] = max(earliest[task.name], fixed_dates[dep] + timedelta(days=1))
+
+    tail = _tail_hours(tasks, indegree)
+
+    ready = [
+        (task.priority, -tail[name], earliest[name], name) for name, task in tasks.items() if not indegree[name]
+    ]
+    heapq.heapify(ready)
+    while ready:
+        _priority, _tail, not_before, name = heapq.heappop(ready)
+        task = tasks[name]
+        finish = capacity.place(task.team, task.hours, not_before)
+        if finish is None:
+            result.unscheduled[name] = f"No {task.team} capacity within {HORIZON_DAYS} days"
+
+        for succ in task.successors:
+            if finish is None:
+                result.unscheduled.setdefault(succ, f"Depends on unscheduled task {name}")
+            else:
+                earliest[succ] = max(earliest[succ], finish + timedelta(days=1))
+            indegree[succ] -= 1
+            if not indegree[succ]:
+                if succ in result.unscheduled:
+                    _propagate_unscheduled(tasks, succ, result, indegree)
+                else:
+                    heapq.heappush(ready, (tasks[succ].priority, -tail[succ], earliest[succ], succ))
+        if finish is not None:
+            result.scheduled[name] = finish
+
+    for name in tasks:
+        if name not in result.scheduled and name not in result.unscheduled:
+            result.unscheduled[name] = "Dependency cycle"
+
+    if not dry_run and result.scheduled:
+        _write_plan(result.scheduled)
+    return result
+
+
+@frappe.whitelist()
+def run_task_scheduler(start_date: str | None = None, reschedule: int = 0, dry_run: int = 1) -> dict[str, Any]:
+    """Scheduler team entry point. Defaults to a dry run; pass dry_run=0 to save the plan."""
+    frappe.only_for(("System Manager", "Projects Manager"))
+    return schedule_tasks(start_date, reschedule=bool(int(reschedule)), dry_run=bool(int(dry_run))).as_dict()
+
+
+def schedule_unscheduled_tasks() -> None:
+    """Background job: plan newly created tasks (e.g. after a Job Packet approval)."""
+    schedule_tasks()
+
+
+def enqueue_task_scheduling() -> None:
+    frappe.enqueue(
+        "probuild.probuild.task_scheduler.schedule_unscheduled_tasks",
+        queue="long",
+        job_id="probuild_task_scheduler",
+        deduplicate=True,
+        enqueue_after_commit=True,
+    )
+
+
+class _Capacity:
+    """Remaining hours per team per day (day index from start_date), filled lazily."""
+
+    def __init__(self, start_date: date, weekday_hours: dict[str, list[float]]):
+        self.start_date = start_date
+        self.weekday_hours = weekday_hours
+        self.remaining: dict[str, list[float]] = {}
+        # First day index that may still have free hours, per team; everything before is full.
+        self.first_free: dict[str, int] = defaultdict(int)
+
+    def _days(self, team: str) -> list[float]:
+        days = self.remaining.get(team)
+        if days is None:
+            hours = self.weekday_hours[team]
+            first = self.start_date.weekday()
+            days = [float(hours[(first + i) % 7]) for i in range(HORIZON_DAYS)]
+            self.remaining[team] = days
+        return days
+
+    def reserve(self, team: str | None, day: date, hours: float) -> None:
+        offset = (day - self.start_date).days
+        if team in self.weekday_hours and 0 <= offset < HORIZON_DAYS:
+            days = self._days(team)
+            days[offset] = max(0.0, days[offset] - hours)
+
+    def place(self, team: str | None, hours: float, not_before: date) -> date | None:
+        """Consume `hours` from `not_before` onwards; returns the finishing day."""
+        offset = max((not_before - self.start_date).days, 0)
+        if team not in self.weekday_hours or hours <= 0:
+            # Not capacity-limited (or no work to book): finishes on its earliest day.
+            return self.start_date + timedelta(days=offset) if offset < HORIZON_DAYS else None
+
+        days = self._days(team)
+        i = max(offset, self.first_free[team])
+        left = hours
+        while i < HORIZON_DAYS:
+            if days[i] > 0:
+                used = min(days[i], left)
+                days[i] -= used
+                left -= used
+                if left <= 1e-9:
+                    break
+            i += 1
+        else:
+            return None
+
+        while self.first_free[team] < HORIZON_DAYS and days[self.first_free[team]] <= 1e-9:
+            self.first_free[team] += 1
+        return self.start_date + timedelta(days=i)
+
+
+def _load_tasks(reschedule: bool) -> tuple[dict[str, _Task], dict[str, tuple[str | None, date, float]]]:
+    """(tasks to plan, open tasks that keep their date: name -> (team, planned date, hours))."""
+    rows = frappe.get_all(
+        "Task",
+        filters={"status": ["not in", ["Completed", "Cancelled", "Template"]]},
+        fields=["name", "status", "probuild_team", "expected_time", "priority", "probuild_planned_date"],
+    )
+    tasks: dict[str, _Task] = {}
+    fixed: dict[str, tuple[str | None, date, float]] = {}
+    for r in rows:
+        keeps_date = r.probuild_planned_date and (not reschedule or r.status != "Open")
+        if keeps_date:
+            fixed[r.name] = (r.probuild_team, getdate(r.probuild_planned_date), flt(r.expected_time))
+        else:
+            tasks[r.name] = _Task(
+                name=r.name,
+                team=r.probuild_team,
+                hours=flt(r.expected_time),
+                priority=PRIORITY_RANK.get(r.priority, PRIORITY_RANK["Medium"]),
+            )
+
+    if tasks:
+        for parent, dep in frappe.db.sql(
+            """
+            select d.parent, d.task
+            from `tabTask Depends On` d
+            join `tabTask` t on t.name = d.parent
+            where d.parenttype = 'Task' and t.status not in ('Completed', 'Cancelled', 'Template')
+            """
+        ):
+            if parent in tasks and dep:
+                tasks[parent].depends_on.append(dep)
+    return tasks, fixed
+
+
+def _planned_load(fixed: dict[str, tuple[str | None, date, float]], start_date: date):
+    for team, day, hours in fixed.values():
+        if day >= start_date and hours:
+            yield team, day, hours
+
+
+def _tail_hours(tasks: dict[str, _Task], indegree: dict[str, int]) -> dict[str, float]:
+    """Hours of the longest dependency chain starting at each task (itself included)."""
+    remaining = dict(indegree)
+    order = [name for name, n in remaining.items() if not n]
+    for name in order:
+        for succ in tasks[name].successors:
+            remaining[succ] -= 1
+            if not remaining[succ]:
+                order.append(succ)
+
+    tail = {name: tasks[name].hours for name in tasks}
+    for name in reversed(order):
+        succ_tail = max((tail[s] for s in tasks[name].successors), default=0.0)
+        tail[name] = tasks[name].hours + succ_tail
+    return tail
+
+
+def _propagate_unscheduled(tasks: dict[str, _Task], name: str, result: ScheduleResult, indegree: dict[str, int]):
+    stack = [name]
+    while stack:
+        current = stack.pop()
+        for succ in tasks[current].successors:
+            result.unscheduled.setdefault(succ, f"Depends on unscheduled task {current}")
+            indegree[succ] -= 1
+            if not indegree[succ]:
+                stack.append(succ)
+
+
+def _write_plan(plan: dict[str, date]) -> None:
+    # One CASE update per chunk instead of a save() per task. probuild_due_date is derived
+    # from the planned date (see events.task_validate), so it is written alongside.
+    frappe.db.bulk_update(
+        "Task",
+        {name: {"probuild_planned_date": day, "probuild_due_date": day} for name, day in plan.items()},
+        chunk_size=500,
+    )
+    frappe.db.after_commit.add(invalidate_open_tasks_snapshot)
+    frappe.db.after_commit.add(invalidate_board_snapshot)
@@ -0,0 +1,142 @@
+from __future__ import annotations
+
+from datetime import datetime, timedelta
+
+import frappe
+from frappe.desk.doctype.notification_log.notification_log import enqueue_create_notification
+from frappe.utils import get_datetime, get_time, getdate, now_datetime
+
+from probuild.probuild.doctype.kiosk_daily_time_summary.kiosk_daily_time_summary import apply_summary_deltas
+from probuild.probuild.shopfloor import publish_rows
+
+DEFAULT_MAX_TIMER_HOURS = 12
+
+
+def stop_stale_kiosk_timers() -> list[str]:
+    """
+    Hourly: stop Running kiosk timers that workers forgot to clock off.
+
+    A timer is stale once it passes its station's shift end (site config
+    `probuild_kiosk_shift_end`, e.g. {"PanelsBench": "15:30", "default": "16:00"}) or, for
+    stations without one, `probuild_kiosk_max_timer_hours` after it started. Stale timers are
+    stopped at that cutoff, not at the time the job runs, and flagged for review.
+    """
+    now = now_datetime()
+    # Locked until commit: a worker stopping one of these meanwhile waits, then finds it
+    # already stopped, so the cutoff never overwrites their stop (or is counted twice).
+    log_table = frappe.qb.DocType("Kiosk Time Log")
+    running = (
+        frappe.qb.from_(log_table)
+        .select(
+            log_table.name,
+            log_table.worker,
+            log_table.task,
+            log_table.project,
+            log_table.started_at,
+            log_table.station,
+        )
+        .where(log_table.status == "Running")
+        .for_update()
+        .run(as_dict=True)
+    )
+
+    stale = []
+    for log in running:
+        cutoff = _timer_cutoff(get_datetime(log.started_at), log.station)
+        if cutoff <= now:
+            stale.append((log, cutoff))
+    if not stale:
+        return []
+
+    # One UPDATE for every stale timer; durations are computed in SQL from each cutoff.
+    names = [log.name for log, _cutoff in stale]
+    case_sql = " ".join(["when %s then %s"] * len(stale))
+    case_values = [v for log, cutoff in stale for v in (log.name, cutoff)]
+    frappe.db.sql(
+        f"""
+        update `tabKiosk Time Log`
+        set status = 'Stopped',
+            running_worker = null,
+            auto_stopped = 1,
+            needs_review = 1,
+            stopped_at = case name {case_sql} end,
+            duration_seconds = greatest(0, timestampdiff(second, started_at, case name {case_sql} end)),
+            modified = %s
+        where name in %s and status = 'Running'
+        """,
+        (*case_values, *case_values, now, tuple(names)),
+    )
+
+    # Only rows this UPDATE stopped count towards the summary (belt and braces with the lock).
+    stopped = set(
+        frappe.get_all(
+            "Kiosk Time Log",
+            filters={"name": ["in", names], "status": "Stopped", "auto_stopped": 1, "modified": now},
+            pluck="name",
+        )
+    )
+    stale = [(log, cutoff) for log, cutoff in stale if log.name in stopped]
+    names = [log.name for log, _cutoff in stale]
+    if not stale:
+        return []
+
+    apply_summary_deltas(
+        [
+            (
+                getdate(log.started_at),
+                log.worker,
+                log.task,
+                log.project,
+                max(0, int((cutoff - get_datetime(log.started_at)).total_seconds())),
+                1,
+            )
+            for log, cutoff in stale
+        ]
+    )
+
+    publish_rows(
+        "Kiosk Time Log",
+        [{**log, "status": "Stopped", "stopped_at": cutoff} for log, cutoff in stale],
+    )
+    _send_stale_timer_digest(stale)
+    return names
+
+
+def _timer_cutoff(started_at: datetime, station: str | None) -> datetime:
+    shift_ends = frappe.conf.get("probuild_kiosk_shift_end") or {}
+    shift_end = shift_ends.get(station or "") or shift_ends.get("default")
+    if shift_end:
+        cutoff = datetime.combine(started_at.date(), get_time(shift_end))
+        if cutoff <= started_at:
+            # Started after that day's shift end (overtime): allow until the next day's.
+            cutoff += timedelta(days=1)
+        return cutoff
+
+    max_hours = float(frappe.conf.get("probuild_kiosk_max_timer_hours") or DEFAULT_MAX_TIMER_HOURS)
+    return started_at + timedelta(hours=max_hours)
+
+
+def _send_stale_timer_digest(stale: list[tuple[dict, datetime]]) -> None:
+    recipients = frappe.conf.get("probuild_kiosk_digest_recipients") or frappe.get_all(
+        "Has Role",
+        filters={"role": "System Manager", "parenttype": "User", "parent": ["not in", ["Guest"]]},
+        pluck="parent",
+        distinct=True,
+    )
+    if not recipients:
+        return
+
+    lines = "".join(
+        f"<li>{frappe.utils.escape_html(log.worker)} - {frappe.utils.escape_html(log.task)} "
+        f"(started {log.started_at}, stopped at {cutoff})</li>"
+        for log, cutoff in stale
+    )
+    enqueue_create_notification(
+        recipients,
+        {
+            "type": "Alert",
+            "document_type": "Kiosk Time Log",
+            "subject": f"{len(stale)} kiosk timer(s) auto-stopped and flagged for review",
+            "email_content": f"<ul>{lines}</ul>",
+        },
+    )
@@ -75,6 +75,10 @@ def create_sample_job_packet(job_type: str = "Supply Only") -> None:
         }
     )
     jp.insert(ignore_permissions=True)
+    # Approval side effects normally run in a background job; run it inline here.
+    from probuild.probuild.doctype.job_packet.job_packet import process_approval
+
+    process_approval(jp.name, jp.revision)
 
     tasks = frappe.get_all("Task", filters={"project": project.name}, pluck="name")
     dispatches = frappe.get_all("Dispatch Deliverable", filters={"project": project.name}, pluck="name")
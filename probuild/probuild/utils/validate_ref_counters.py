@@ -0,0 +1,59 @@
+from __future__ import annotations
+
+import multiprocessing
+from collections import Counter
+
+import frappe
+
+
+def validate_parallel_invoice_numbering(workers: int = 8, invoices_per_worker: int = 10, kind: str = "Milestone"):
+    """
+    Name Sales Invoices for one base ref from parallel worker processes and check that every
+    worker got a distinct number.
+
+    Run with:
+        bench --site <site> execute probuild.probuild.utils.validate_ref_counters.validate_parallel_invoice_numbering
+
+    Each worker has its own DB connection and commits after every invoice, like concurrent
+    requests would. Invoices go through the real sales_invoice_autoname hook but are not
+    inserted, so no accounting setup (customer, items, company) is needed. The counter rows
+    are left in place under a throwaway base ref.
+    """
+    base_ref = f"TEST-{frappe.generate_hash(length=6).upper()}"
+    print("=" * 70)
+    print(f"PARALLEL {kind.upper()} NUMBERING: {workers} workers x {invoices_per_worker} invoices ({base_ref})")
+    print("=" * 70)
+
+    ctx = multiprocessing.get_context("spawn")
+    args = [(frappe.local.site, frappe.local.sites_path, base_ref, kind, invoices_per_worker)] * workers
+    with ctx.Pool(workers) as pool:
+        names = [name for batch in pool.starmap(_name_invoices, args) for name in batch]
+
+    duplicates = {name: n for name, n in Counter(names).items() if n > 1}
+    expected = workers * invoices_per_worker
+    print(f"\nIssued {len(names)} names, {len(set(names))} distinct (expected {expected})")
+    assert not duplicates, f"Duplicate invoice names issued: {duplicates}"
+    assert len(set(names)) == expected, f"Expected {expected} distinct names, got {len(set(names))}"
+    print("✓ No collisions")
+    print("=" * 70)
+    return {"base_ref": base_ref, "issued": len(names)}
+
+
+def _name_invoices(site: str, sites_path: str, base_ref: str, kind: str, count: int) -> list[str]:
+    from probuild.probuild.events import sales_invoice_autoname
+
+    frappe.init(site=site, sites_path=sites_path)
+    frappe.connect()
+    try:
+        names = []
+        for _ in range(count):
+            invoice = frappe.new_doc("Sales Invoice")
+            invoice.probuild_base_ref = base_ref
+            invoice.probuild_invoice_kind = kind
+            invoice.probuild_milestone_total = 99
+            sales_invoice_autoname(invoice)
+            names.append(invoice.name)
+            frappe.db.commit()
+        return names
+    finally:
+        frappe.destroy()
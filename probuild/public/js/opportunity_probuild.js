@@ -8,6 +8,9 @@ frappe.ui.form.on("Opportunity", {
         // Don't run on new/unsaved forms
         if (frm.is_new()) return;
         
+        // Soil warning from the stored background lookup (no API call from the form)
+        probuild.soil.show_warning(frm);
+        
         // Add "Send SMS" button
         frm.add_custom_button(__("Send SMS"), function() {
             probuild_show_sms_dialog(frm);
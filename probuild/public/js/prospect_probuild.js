@@ -15,6 +15,9 @@ frappe.ui.form.on("Prospect", {
             // Show message that they need to save first
             probuild_show_save_first_message(frm);
         } else {
+            // Soil warning from the stored background lookup (no API call from the form)
+            probuild.soil.show_warning(frm);
+            
             // Add prominent "New Opportunity" button (not overriding primary action)
             frm.add_custom_button(
                 __("New Opportunity"),
@@ -0,0 +1,24 @@
+/**
+ * Soil warning headline shared by the Opportunity and Prospect forms.
+ */
+
+frappe.provide('probuild.soil');
+
+/**
+ * Show the stored soil lookup as a headline. Soil data is resolved in the background
+ * when site coordinates are saved, so the form only reads the probuild_soil_* fields.
+ */
+probuild.soil.show_warning = function (frm) {
+    if (!frm.doc.probuild_soil_checked_on) return;
+
+    let severity = frm.doc.probuild_soil_severity || "none";
+    let color = { high: "red", medium: "orange", low: "blue" }[severity] || "green";
+    let message = frm.doc.probuild_soil_warning
+        || __("No soil concerns ({0})", [frm.doc.probuild_soil_category || __("unknown")]);
+
+    frm.dashboard.set_headline_alert(
+        `<div>${frappe.utils.escape_html(message)}</div>
+        <div class="small text-muted">${__("Equipment")}: ${frappe.utils.escape_html(frm.doc.probuild_soil_equipment || "")}</div>`,
+        color
+    );
+};
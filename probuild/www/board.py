@@ -2,12 +2,18 @@ from __future__ import annotations
 
 import frappe
 
+from probuild.probuild.api.wallboard import get_board_teams
+
 
 def get_context(context):
     if frappe.session.user == "Guest":
         frappe.throw("Login required for board.")
     context.no_cache = 1
-    context.title = "Production Board"
+    context.team = frappe.form_dict.get("team") or None
+    if context.team and context.team not in get_board_teams():
+        frappe.throw("Unknown team.")
+    team = frappe.utils.escape_html(context.team) if context.team else None
+    context.title = f"{team} Board" if team else "Production Board"
     return context
 
 